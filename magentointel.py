@@ -25,15 +25,137 @@ SOFTWARE.
 
 import os
 import re
-import glob
-import copy
 import json
-import codecs
-import subprocess
-import hashlib
-#import cProfile, pstats
+import threading
+import traceback
+import Queue
 import sublime
 import sublime_plugin
+from magentointel_engine import CompletionEngine, Document, Environment, set_environment, job_context
+from magentointel_engine import get_setting, window_folders, is_magento, get_project, tokenizers, compare_tokens, PHP_FILE
+from magentointel_engine import token_stores, symbol_cache, merged_symbol_cache, class_indexes, traces, format_traces
+
+
+class SublimeEnvironment(Environment):
+    '''
+    Project folders from the active window and settings from
+    MagentoIntel.sublime-settings.
+    '''
+
+    def get_folders(self):
+        return sublime.active_window().folders()
+
+    def get_setting(self, name, default=None):
+        return sublime.load_settings('MagentoIntel.sublime-settings').get(name, default)
+
+
+set_environment(SublimeEnvironment())
+
+'''
+The engine shared by the event listener and the commands.
+'''
+completion_engine = CompletionEngine()
+
+
+def view_document(view, prefix=None):
+    '''
+    Copy the code and cursor position of a view for the engine.
+    '''
+    return Document(view.id(), view.substr(sublime.Region(0, view.size())), view.sel()[0].a, view.file_name(),
+        prefix)
+
+
+COMPLETION_WORKERS = 2
+
+'''
+Settings that are copied for work done off the main thread.
+'''
+SETTING_NAMES = ('tokenizer', 'symbol_cache_size', 'token_cache_size', 'trace_completions')
+
+
+class CompletionPipeline(object):
+    '''
+    Runs completion work on a pool of worker threads.
+
+    Each job carries the window's folders and the settings, and jobs for a
+    view get a copy of its code, so workers never touch the sublime API. Jobs
+    have a name (e.g. the view id) and a new job supersedes the pending one
+    with the same name: superseded jobs are skipped when they come off the
+    queue, stop at the next checkpoint if they're already running, and their
+    results are dropped.
+    '''
+
+    def __init__(self, size=COMPLETION_WORKERS):
+        self.size = size
+        self.queue = Queue.Queue()
+        self.pending = {}
+        self.results = {}
+        self.threads = []
+        self.lock = threading.Lock()
+
+    def start(self):
+        for i in range(0, self.size):
+            thread = threading.Thread(target=self.work)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, name, key, run, done=None):
+        '''
+        Queue a job that calls run(). If the job finishes without being
+        superseded and run() returned something, the result is kept in
+        results[name] and done(result) is called on the main thread.
+        '''
+        if not self.threads:
+            self.start()
+
+        self.lock.acquire()
+        try:
+            if self.pending.get(name) == key:
+                return
+            self.pending[name] = key
+        finally:
+            self.lock.release()
+
+        values = {}
+        for setting in SETTING_NAMES:
+            values[setting] = get_setting(setting)
+        self.queue.put((name, key, window_folders(), values, run, done))
+
+    def is_current(self, name, key):
+        return self.pending.get(name) == key
+
+    def work(self):
+        while True:
+            name, key, folders, settings, run, done = self.queue.get()
+            if not self.is_current(name, key):
+                continue
+
+            job_context.folders = folders
+            job_context.settings = settings
+            job_context.cancelled = lambda: not self.is_current(name, key)
+            try:
+                data = run()
+            except Exception:
+                data = None
+                traceback.print_exc()
+            finally:
+                job_context.folders = None
+                job_context.settings = None
+                job_context.cancelled = None
+
+            self.lock.acquire()
+            try:
+                if not self.is_current(name, key):
+                    continue
+                del self.pending[name]
+            finally:
+                self.lock.release()
+
+            if data != None:
+                self.results[name] = (key, data)
+                if done:
+                    sublime.set_timeout(lambda done=done, data=data: done(data), 0)
 
 
 class MagentoComplete(sublime_plugin.EventListener):
@@ -42,523 +164,282 @@ class MagentoComplete(sublime_plugin.EventListener):
     '''
 
     def __init__(self):
-        self.get_all_token_names()
+        self.pipeline = CompletionPipeline()
 
     def on_query_completions(self, view, prefix, locations):
         data = None
 
-        if is_magento():
-            point = view.sel()[0].a
-            if point > 2:
-                region = sublime.Region(point - 2, point)
-                if view.substr(region) == '->' or view.substr(region) == '::':
-                    #cProfile.runctx('data = self.find_completions(view)', globals(), locals())
-                    data = self.find_completions(view)
+        point = view.sel()[0].a - len(prefix)
+        if point > 2:
+            trigger = view.substr(sublime.Region(point - 2, point))
+            if (trigger == '->' or trigger == '::') and is_magento():
+                if get_setting('async_completions', True):
+                    data = self.query_completions(view, prefix)
+                else:
+                    data = completion_engine.find_completions(view_document(view, prefix))
 
         if data:
             return (data, sublime.INHIBIT_EXPLICIT_COMPLETIONS | sublime.INHIBIT_WORD_COMPLETIONS)
         else:
             return False
 
-    def get_cache_folder(self):
-        for f in sublime.active_window().folders():
-            folder = f
-            break
-
-        if f:
-            folder = os.path.join(f, '.magentointel-cache')
-            if not os.path.exists(folder):
-                os.mkdir(folder)
+    def on_close(self, view):
+        if view.id() in completion_engine.buffers:
+            del completion_engine.buffers[view.id()]
+        if view.id() in self.pipeline.results:
+            del self.pipeline.results[view.id()]
 
-            return folder
+    def query_completions(self, view, prefix):
+        '''
+        Get completions without blocking the UI.
+
+        Returns the finished results for this exact spot if there are any.
+        Otherwise the completions are computed in the background, and the
+        results for the same expression from before the last edit (if any)
+        are returned in the meantime. Those were filtered by a shorter prefix
+        at most, and Sublime Text narrows them down as the name is typed. The
+        popup is shown again with the full list once it's ready.
+        '''
+        document = view_document(view, prefix)
+        point = document.point
+        start = point - len(prefix)
+        expression = re.split(r'[;{}]|<\?(?:php)?', document.code[max(0, start - 1000):start])[-1].strip()
+        key = (expression, point, len(document.code))
+
+        result = self.pipeline.results.get(view.id())
+        if result and result[0] == key:
+            return result[1]
+
+        def done(data):
+            if view.sel()[0].a != point or view.size() != key[2]:
+                return
+            if result and result[0][0] == expression and result[1] == data:
+                return
+            view.run_command('hide_auto_complete')
+            view.run_command('auto_complete', {'disable_auto_insert': True,
+                'api_completions_only': True, 'next_completion_if_showing': False})
+
+        self.pipeline.submit(view.id(), key, lambda: completion_engine.find_completions(document), done)
+
+        if result and result[0][0] == expression:
+            return result[1]
 
         return None
 
-    def get_all_tokens(self, code=None, cache=True):
-        '''
-        Use the command-line PHP interpreter to tokenize the code
-        '''
-        code = code.encode('utf-8')
-        
-        if cache:
-            m = hashlib.md5()
-            m.update(code)
-            key = m.hexdigest()
-            cachefile = os.path.join(self.get_cache_folder(), key)
-            if os.path.exists(cachefile):
-                tokens = json.loads(codecs.open(cachefile, encoding='utf-8', mode='r').read())
-                return tokens
-
-        # This code is a performance bottleneck. Caching helps but there's still a significant delay
-        # because the first call to get_all_tokens with the partial code up to the cursor can't be
-        # cached.
-        code = code.replace("'", "\\'")
-        php = "echo json_encode(token_get_all('{code}'));".format(code=code)
-        tokens = subprocess.Popen(['php', '-r', php], bufsize=1, stdout=subprocess.PIPE, shell=False).communicate()[0]
-        tokens = json.loads(tokens)
-
-        if cache and cachefile:
-            codecs.open(cachefile, encoding='utf-8', mode='w').write(json.dumps(tokens))
-
-        return tokens
-
-    def get_all_token_names(self):
-        '''
-        Gets names for all token constants.
-
-        The token constants (http://us2.php.net/manual/en/tokens.php) values
-        aren't consistent between different versions of PHP. The values are
-        automatically generated based on PHP's underlying parser infrastructure.
-        This code generates a dictionary of token constants from the installed
-        version of PHP. The dictionary is later used to convert the token codes
-        returned by PHP's token_get_all() into names.
-        '''
-        self._constants = {}
-        self._constants[0] = None
-        php = ''
-        for i in range(0, 999):
-            php += "echo '{code},'.token_name({code}).'|';".format(code=i)
-        result = subprocess.Popen(['php', '-r', php], bufsize=1, stdout=subprocess.PIPE, shell=False).communicate()[0]
-        for constant in result.split('|'):
-            if constant.find(',') >= 0:
-                code, name = constant.split(',')
-                if name != 'UNKNOWN':
-                    self._constants[str(code)] = name
-
-    def get_token_name(self, code):
-        '''
-        Get name for a given token code.
-        '''
-        name = None
-        code = str(code)
-        if code in self._constants:
-            name = self._constants[code]
-        return name
+    def on_activated(self, view):
+        if get_project(refresh=True).root:
+            completion_engine.get_class_index().refresh_in_background()
+            completion_engine.get_factory_aliases().refresh_in_background()
+            completion_engine.get_symbol_index()
+            completion_engine.check_checkout()
 
-    def token(self, token):
-        '''
-        Parse the raw token data into a more consistent form.
-        '''
-        if type(token).__name__ == 'list':
-            kind = self.get_token_name(token[0])
-            stmt = token[1]
-        else:
-            kind = self.get_token_name(0)
-            stmt = token
+    def on_load(self, view):
+        if is_magento():
+            self.precompute(view)
 
-        return kind, stmt
+    def on_post_save(self, view):
+        if is_magento() and view.file_name():
+            completion_engine.get_class_index().update_file(view.file_name())
+            completion_engine.get_factory_aliases().update_file(view.file_name())
+            symbol_cache.remove(view.file_name())
+            merged_symbol_cache.clear()
+            self.precompute(view)
 
-    def get_class(self, tokens):
+    def precompute(self, view):
         '''
-        Get the first class definition
+        Warm the symbol cache in the background for the classes a PHP file
+        refers to, so the first completion in it is as fast as the rest.
         '''
-        className = None
-        capture_next = False
-        for token in tokens:
-            kind, stmt = self.token(token)
+        if not view.file_name() or not PHP_FILE.search(view.file_name()):
+            return
 
-            if kind == 'T_CLASS':
-                # class
-                capture_next = True
-            elif kind == 'T_STRING' and capture_next:
-                className = stmt
-                break
+        document = view_document(view)
+        self.pipeline.submit(('precompute', view.id()), hash(document.code),
+            lambda: completion_engine.warm_symbols(document.code, document.fileName))
 
-        return className
 
-    def get_parent_class(self, tokens):
-        '''
-        Get the class that the first class definition extends
-        '''
-        className = None
-        capture_next = False
-        for token in tokens:
-            kind, stmt = self.token(token)
+class MagentoOpenCommand(sublime_plugin.WindowCommand):
+    '''
+    Open the files of the classes named at each selection.
+    '''
 
-            if kind == 'T_EXTENDS':
-                # extends
-                capture_next = True
-            elif kind == 'T_STRING' and capture_next:
-                className = stmt
-                break
+    def run(self):
+        view = self.window.active_view()
+        classNames = []
+        for region in view.sel():
+            className = view.substr(expand_word(view, region))
+            if className and className not in classNames:
+                classNames.append(className)
 
-        return className
+        if not classNames:
+            sublime.status_message('Select a class name first')
+            return
 
-    def get_return_class(self, tokens, searchToken):
-        '''
-        Search tokens for token and return its type.
+        missing = []
+        for className in classNames:
+            path = completion_engine.build_magento_path(className)
+            if path == None:
+                missing.append(className)
+            elif len(classNames) == 1:
+                self.window.open_file(path, sublime.TRANSIENT)
+            else:
+                self.window.open_file(path)
 
-        When the token is found, return its @var or @return hint
-        '''
-        className = None
-        nest = 0
-        for token in tokens:
-            kind, stmt = self.token(token)
-            if kind == 'T_STRING' and stmt == searchToken and nest == 1:
-                break
-            if stmt == '{':
-                nest += 1
-            if stmt == '}':
-                nest -= 1
-                if nest == 1:
-                    className = ''
-            if kind == None and stmt == ';' and nest == 1:
-                className = ''
-            elif kind == 'T_DOC_COMMENT' and nest == 1:
-                className = re.findall('@var (.*)', stmt)
-                if not className:
-                    className = re.findall('@return (.*)', stmt)
-                if className:
-                    className = className[0].strip()
-
-        print searchToken, 'returns', className
-        return className
-
-    def find_completions(self, view):
-        '''
-        Scan files for completions for the current context
-        '''
+        if missing:
+            sublime.status_message('Class not found: {names}'.format(names=', '.join(missing)))
 
-        data = []
+    def is_enabled(self):
+        return is_magento()
 
-        '''Get token to be completed'''
-        point = view.sel()[0].a
-        code = view.substr(sublime.Region(0, point))
-        tokens = self.get_all_tokens(code=code, cache=False)
 
-        '''
-        Convert the token to a class name.
-
-        First, read the list backwards until we get to an enclosing block or
-        the previous statement.
-        Then create a new token list from that point and iterate forward.
-            Get a class name and parse that file for definitions.
-                The very first token should be a variable or static class name.
-            The next token could be -> or ::.
-            Then the next token should be a method name or class member.
-            Find the return type or member type.
-            Repeat.
-        '''
-        tokens.reverse()
-        nest = 0
-        end = 0
-        for t in tokens:
-            kind, stmt = self.token(t)
-
-            if kind == None and stmt == '(':
-                nest += 1
-            if kind == None and stmt == ')':
-                nest -= 1
-            if kind == None and stmt == ';':
-                break
-            if kind == None and (stmt == '{' or stmt == '}'):
-                break
-            if nest > 0:
-                break
-            end += 1
-
-        tokens = tokens[:end]
-        tokens.reverse()
-
-        className = None
-        nest = 0
-        lastToken = None
-        lastClass = None
-        code = view.substr(sublime.Region(0, view.size()))
-        for token in tokens:
-            if token:
-                kind, stmt = self.token(token)
-
-                thistoken = [kind, stmt]
-
-                if kind == 'T_WHITESPACE':
-                    # white space
-                    pass
-                elif kind == 'T_VARIABLE' and nest == 0:
-                    # variable
-                    lastToken = thistoken
-                elif kind == 'T_STRING' and nest == 0:
-                    # string (method or class name)
-                    if stmt == 'getModel' or stmt == 'getSingleton' or stmt == 'helper':
-                        factory = stmt
-                    lastToken = thistoken
-                elif kind == None and stmt == '(':
-                    nest += 1
-                elif kind == None and stmt == ')':
-                    nest -= 1
-                elif kind == 'T_CONSTANT_ENCAPSED_STRING' and factory:
-                    lastToken = ['T_STRING', 'Mage::{factory}({path})'.format(factory=factory, path=stmt)]
-                    factory = None
-                elif kind == 'T_OBJECT_OPERATOR' and nest == 0:
-                    # object operator ->
-                    className = self.convert_token(view, code, lastToken[1])
-                    if not className:
-                        data = []
-                elif kind == 'T_DOUBLE_COLON' and nest == 0:
-                    # double colon ::
-                    className = self.convert_token(view, code, lastToken[1])
-                    if not className:
-                        className = lastToken[1]
-
-                if not className:
-                    continue
+class MagentoFindClassCommand(sublime_plugin.WindowCommand):
+    '''
+    Search all the classes in the class index from the quick panel and open
+    the chosen one.
+    '''
 
-                if className == lastClass:
-                    continue
-                else:
-                    data = []
-
-                    lastClass = className
-
-                    '''Build path to source class'''
-                    path = self.build_magento_path(className)
-                    if not path:
-                        return data
-
-                    '''Scan source for functions'''
-                    if kind == 'T_DOUBLE_COLON' or lastToken[1] == 'self' or lastToken[1] == 'parent':
-                        context = 'static'
-                    elif lastToken[1].startswith('$this'):
-                        context = 'private'
-                    else:
-                        context = 'public'
-                    symbols, code = self.scan_file(file=path, context=context)
-                    if not symbols:
-                        return data
-
-                    '''Return snippets'''
-                    for f in symbols.keys():
-                        name = f
-                        i = 1
-                        args = []
-                        if symbols[f]['kind'] == 'function':
-                            for a in symbols[f]['args']:
-                                a = a.replace('$', '\$')
-                                args.append('${' + str(i) + ':' + a + '}')
-                                i += 1
-
-                            snippet = '{name}({args})'.format(name=name, args=', '.join(args))
-                        else:
-                            snippet = f
-
-                        data.append(tuple([f + '\t' + className, snippet]))
-
-        return sorted(data)
-
-    def convert_token(self, view, code, token):
-        '''
-        Given a token, convert it into a Magento class name.
+    def run(self):
+        index = completion_engine.get_class_index()
+        if not index.ready:
+            sublime.status_message('MagentoIntel: the class index is still being built')
+            return
 
-        If the token is a variable (e.g. $var) then we search for @var hints.
-        If the token is a Magento factory class, then convert those to Mage_*
-            class names.
-        '''
-        className = None
-        token = token.strip()
-
-        if token.startswith('$this') or token == 'self':
-            tokens = self.get_all_tokens(code)
-            className = self.get_class(tokens)
-
-        elif token == 'parent':
-            tokens = self.get_all_tokens(code)
-            className = self.get_parent_class(tokens)
-
-        elif token.startswith('$'):
-            searchtext = token.replace('$', '\$')
-            searchtext = searchtext.replace('(', '\(')
-            searchtext = searchtext.replace(')', '\)')
-            searchtext += ' .* '
-            found = view.find('@var ' + searchtext, 0)
-            if found:
-                definition = view.substr(found).strip()
-                className = definition.split(' ')[2]
-
-        elif token.startswith('Mage::getModel') or token.startswith('Mage::getSingleton'):
-            key = re.findall("\('(.*)'\)", token)
-            (module, theclass) = key[0].split('/')
-            className = 'Mage_{m}_Model_'.format(m=cap_first_letter(module))
-            classes = []
-            for t in theclass.split('_'):
-                classes.append(cap_first_letter(t))
-            className += '_'.join(classes)
-
-        elif token.startswith('Mage::helper'):
-            key = re.findall("\('(.*)'\)", token)
-            module = key[0]
-            className = 'Mage_{m}_Helper_Data'.format(m=cap_first_letter(module))
-
-        elif token == 'Mage':
-            className = 'Mage'
+        listing = index.list_classes()
 
+        def done(i):
+            if i >= 0:
+                self.window.open_file(os.path.join(index.root, listing[i][1]))
+
+        self.window.show_quick_panel(listing, done)
+
+    def is_enabled(self):
+        return is_magento()
+
+
+class MagentoIndexProjectCommand(sublime_plugin.WindowCommand):
+    '''
+    Index the symbols of every class in the project in the background,
+    showing progress in the status bar.
+    '''
+
+    def run(self):
+        index = completion_engine.get_symbol_index()
+        index.refresh_in_background(force=True)
+        self.show_progress(index)
+
+    def show_progress(self, index):
+        done, total = index.progress
+        if index.refreshing:
+            sublime.status_message('MagentoIntel: indexed {done} of {total} files'.format(done=done, total=total))
+            sublime.set_timeout(lambda: self.show_progress(index), 500)
         else:
-            tokens = self.get_all_tokens(code)
-            className = self.get_return_class(tokens, token)
+            sublime.status_message('MagentoIntel: indexed {count} files'.format(count=len(index.files)))
 
-        return className
+    def is_enabled(self):
+        return is_magento()
 
-    def scan_file(self, file, context='public'):
-        '''
-        Find @var, @param, PHP docs, and function definitions in a file.
 
-        Returns dictionary of completions.
-        '''
-        retval = {}
-
-        source = codecs.open(file, encoding='utf-8', mode='r').read()
-        if context == 'private':
-            symbols = re.findall('(function \w*?)\((.*)\)', source)
-            symbols.extend(re.findall('public (\$\w*).*;', source))
-            symbols.extend(re.findall('protected (\$\w*).*;', source))
-            symbols.extend(re.findall('private (\$\w*).*;', source))
-        elif context == 'static':
-            symbols = re.findall('public static (function \w*?)\((.*)\)', source)
-            symbols.extend(re.findall('(const \w*)=.*;', source))
-            symbols.extend(re.findall('public static (\$\w*).*;', source))
-        elif context == 'public':
-            symbols = re.findall('public (function \w*?)\((.*)\)', source)
-            symbols.extend(re.findall('\s\s(function \w*?)\((.*)\)', source))
-            symbols.extend(re.findall('public (\$\w*).*;', source))
-
-        for parts in symbols:
-            kind = ''
-            returnType = ''
-            if parts[0].startswith('function'):
-                name = parts[0].split(' ')[1]
-                allargs = parts[1]
-                kind = 'function'
-            elif parts.startswith('const'):
-                name = parts.split(' ')[1]
-                allargs = ''
-                kind = 'constant'
-            elif parts.startswith('$'):
-                name = parts
-                allargs = ''
-                kind = 'variable'
-            name = name.strip()
-            args = []
-            if kind == 'function':
-                for a in allargs.split(','):
-                    a = a.strip()
-                    t = a.split('=')
-                    if len(t) > 1:
-                        a = t[0].strip()
-                    t = a.split(' ')
-                    if len(t) == 1:
-                        args.append(t[0].strip())
-                    else:
-                        args.append(t[1].strip())
-            retval[name] = {'kind': kind, 'args': args, 'returnType': returnType}
-
-        return retval, source
-
-    def build_magento_path(self, className):
-        '''
-        Build a file path given a Magento class name.
+class MagentoImportAttributesCommand(sublime_plugin.WindowCommand):
+    '''
+    Import the entity attributes for magic getter and setter completions
+    from the setup scripts and the schema dump, in the background.
+    '''
 
-        Searches in core, lib, local, and community.
-        '''
-        path = None
+    def run(self):
+        attributes = completion_engine.get_attribute_map()
+        attributes.schema = get_setting('schema_dump')
+        attributes.refresh_in_background(force=True)
+        self.show_progress(attributes)
+
+    def show_progress(self, attributes):
+        if attributes.refreshing:
+            sublime.status_message('MagentoIntel: importing attributes')
+            sublime.set_timeout(lambda: self.show_progress(attributes), 500)
+        else:
+            sublime.status_message('MagentoIntel: imported the attributes of {count} entities'.format(
+                count=len(attributes.entities)))
 
-        if className == None:
-            return
+    def is_enabled(self):
+        return is_magento()
 
-        root = self.get_root_folder()
-        if root == None:
+
+class MagentoCompareTokenizersCommand(sublime_plugin.WindowCommand):
+    '''
+    Check the Python lexer against PHP's token_get_all() on the current file.
+    '''
+
+    def run(self):
+        view = self.window.active_view()
+        code = view.substr(sublime.Region(0, view.size())).encode('utf-8')
+        php = tokenizers['php']
+        python = tokenizers['python']
+        phpTokens = php.tokenize(code)
+        phpNames = php.token_names()
+        pythonTokens = python.tokenize(code)
+        pythonNames = python.token_names()
+
+        index = compare_tokens(phpTokens, phpNames, pythonTokens, pythonNames)
+        if index == None:
+            sublime.status_message('Tokenizers agree on all {count} tokens'.format(count=len(phpTokens)))
             return
 
-        '''
-        Look for the class file in various locations
-        '''
-        if path == None:
-            path = [root, 'app', 'code', 'core']
-            path.extend(className.split('_'))
-            path = os.path.join(*path) + '.php'
-            if not os.path.isfile(path):
-                path = None
-
-        if path == None:
-            path = [root, 'app']
-            path.extend(className.split('_'))
-            path = os.path.join(*path) + '.php'
-            if not os.path.isfile(path):
-                path = None
-
-        if path == None:
-            path = [root, 'lib']
-            path.extend(className.split('_'))
-            path = os.path.join(*path) + '.php'
-            if not os.path.isfile(path):
-                path = None
-
-        if path == None:
-            '''Try community and local folders'''
-            folders = ([root, 'app', 'code', 'local'], [root, 'app', 'code', 'community'])
-            for path in folders:
-                path.extend(className.split('_'))
-                path = os.path.join(*path) + '.php'
-                if os.path.isfile(path):
-                    break
-                else:
-                    path = None
-
-        if path == None:
-            '''
-            Imagine an invocation like this: Mage::getModel('module/example').
-            The parser will generate a class name of Mage_Module_Model_Example.
-            If that class isn't found in any of the above scopes, then we try
-            this more intensive search:
-
-            We'll look in all of the local and community folders.
-            We'll iterate over all of the folders in each of those folders and
-                replace the Mage_ part of the class name with the folder.
-                Mage_Module_Model_Example => Folder_Module_Model_Example
-            Then we check if that class exists and stop after the first match.
-            '''
-            folders = ([root, 'app', 'code', 'local'], [root, 'app', 'code', 'community'])
-            for origpath in folders:
-                newpath = copy.copy(origpath)
-                newpath.append('*')
-                for folder in glob.glob(os.path.join(*newpath)):
-                    c = className.split('_')
-                    if c[0] == 'Mage':
-                        c[0] = os.path.basename(folder)
-                    newpath = copy.copy(origpath)
-                    newpath.extend(c)
-                    path = os.path.join(*newpath) + '.php'
-                    if os.path.isfile(path):
-                        break
-                    else:
-                        path = None
-                if path:
-                    break
-
-        return path
-
-    def get_root_folder(self):
-        '''
-        Get the root Magento folder
-        '''
-        root = None
-        for f in sublime.active_window().folders():
-            if os.path.isdir(os.path.join(f, 'app', 'code', 'core', 'Mage')):
-                root = f
-                break
+        def describe(tokens, names):
+            if index >= len(tokens):
+                return '(end of tokens)'
+            token = tokens[index]
+            if type(token).__name__ == 'list':
+                return '{name} {text}'.format(name=names.get(str(token[0])), text=json.dumps(token[1]))
+            return json.dumps(token)
 
-        return root
+        sublime.message_dialog('Tokenizers differ at token {index}:\n\nphp: {php}\npython: {python}'.format(
+            index=index, php=describe(phpTokens, phpNames), python=describe(pythonTokens, pythonNames)))
 
 
-class MagentoOpenCommand(sublime_plugin.WindowCommand):
+class MagentoCacheStatsCommand(sublime_plugin.WindowCommand):
+    '''
+    Show how the caches are being used.
+    '''
+
     def run(self):
-        view = self.window.active_view()
-        className = view.substr(expand_word(view, view.sel()[0]))
-        path = None
-        if className:
-            path = MagentoComplete.build_magento_path(MagentoComplete(), className)
-        if path:
-            self.window.open_file(path, sublime.TRANSIENT)
-        else:
-            sublime.status_message('Select a class name first')
+        project = get_project()
+        lines = ['Magento {version} in {root}'.format(version=project.version or '(unknown version)',
+            root=project.root)]
+        for folder, store in token_stores.items():
+            stats = store.stats()
+            lines.append('Token store ({path})'.format(path=store.path))
+            lines.append('  {entries} entries, {size:.1f} MB'.format(entries=stats['entries'],
+                size=stats['size'] / 1048576.0))
+            lines.append('  {hits} hits, {misses} misses, {evictions} evicted'.format(**stats))
+
+        lines.append('Symbol cache')
+        lines.append('  {entries} files, {size:.1f} MB of {limit:.0f} MB'.format(entries=len(symbol_cache.entries),
+            size=symbol_cache.size / 1048576.0, limit=symbol_cache.limit / 1048576.0))
+        lines.append('  {hits} hits, {misses} misses'.format(hits=symbol_cache.hits, misses=symbol_cache.misses))
+
+        for root, index in class_indexes.items():
+            lines.append('Class index ({root})'.format(root=root))
+            lines.append('  {classes} classes in {files} files'.format(classes=len(index.classes),
+                files=len(index.files)))
+
+        sublime.message_dialog('\n'.join(lines))
+
+    def is_enabled(self):
+        return is_magento()
+
+
+class MagentoTimingReportCommand(sublime_plugin.WindowCommand):
+    '''
+    Show where the time went in recent completions.
+    '''
+
+    def run(self):
+        view = self.window.new_file()
+        view.set_name('MagentoIntel Timing')
+        view.set_scratch(True)
+        edit = view.begin_edit()
+        view.insert(edit, 0, format_traces(traces))
+        view.end_edit(edit)
+        view.set_read_only(True)
 
     def is_enabled(self):
         return is_magento()
@@ -576,14 +457,3 @@ def expand_word(view, region):
         end += 1
 
     return sublime.Region(start, end)
-
-
-def cap_first_letter(word):
-    return word[0].upper() + word[1:]
-
-
-def is_magento():
-    for f in sublime.active_window().folders():
-        if os.path.isdir(os.path.join(f, 'app', 'code', 'core', 'Mage')):
-            return True
-    return False
@@ -0,0 +1,510 @@
+# -*- coding: utf-8 -*-
+
+'''
+MagentoIntel command line
+
+Runs the completion engine outside Sublime Text, for profiling and
+benchmarking.
+
+    python magentointel_cli.py complete path/to/File.php:1234
+    python magentointel_cli.py complete --profile path/to/File.php:1234
+    python magentointel_cli.py complete --trace path/to/File.php:1234
+    python magentointel_cli.py bench
+    python magentointel_cli.py bench --root /path/to/magento
+    python magentointel_cli.py index --root /path/to/magento --processes 8
+    python magentointel_cli.py memory --root /path/to/magento
+    python magentointel_cli.py attributes --root /path/to/magento --schema dump.sql
+
+complete prints the completions at a character offset in a file. bench
+builds a synthetic Magento tree (unless --root is given) and reports
+completion latency with cold and warm caches, file system probes per class
+lookup and tokenizer speed. index builds the project's symbol index with a
+pool of processes; the editor picks it up from the cache folder. memory
+indexes the core code pool (of a synthetic tree unless --root is given) and
+reports how much memory the loaded index takes. attributes imports the
+entity attributes used for magic getter and setter completions.
+'''
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import codecs
+import multiprocessing
+from optparse import OptionParser
+import magentointel_engine as engine
+
+
+BENCH_MODULES = 20
+BENCH_CLASSES = 25
+BENCH_METHODS = 15
+BENCH_RUNS = 20
+
+
+def find_root(path):
+    '''
+    Find the Magento installation a file belongs to.
+    '''
+    folder = os.path.dirname(os.path.abspath(path))
+    while True:
+        if os.path.isdir(os.path.join(folder, 'app', 'code', 'core', 'Mage')):
+            return folder
+        parent = os.path.dirname(folder)
+        if parent == folder:
+            return None
+        folder = parent
+
+
+def use_project(root, tokenizer):
+    '''
+    Point the engine at a Magento installation.
+    '''
+    engine.set_environment(engine.Environment([root], {'tokenizer': tokenizer}))
+
+
+def reset_caches(root):
+    '''
+    Forget everything the engine has cached, in memory and on disk.
+    '''
+    engine.projects.clear()
+    engine.symbol_indexes.clear()
+    engine.attribute_maps.clear()
+    engine.class_entities.clear()
+    engine.token_stores.clear()
+    engine.class_indexes.clear()
+    engine.factory_aliases.clear()
+    engine.class_parents.clear()
+    engine.symbol_cache.clear()
+    engine.merged_symbol_cache.clear()
+
+    folder = os.path.join(root, engine.CACHE_FOLDER_NAME)
+    if os.path.isdir(folder):
+        shutil.rmtree(folder)
+
+
+def wait_for_indexes(intel):
+    '''
+    Wait until the class index and factory aliases are built.
+    '''
+    index = intel.get_class_index()
+    aliases = intel.get_factory_aliases()
+    while index.refreshing or aliases.refreshing:
+        time.sleep(0.01)
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[int(round((len(values) - 1) * percent / 100.0))]
+
+
+def complete(options, args):
+    '''
+    Print the completions at file:offset.
+    '''
+    if len(args) != 1 or ':' not in args[0]:
+        print 'Usage: magentointel_cli.py complete FILE:OFFSET'
+        return 2
+
+    path, offset = args[0].rsplit(':', 1)
+    root = options.root or find_root(path)
+    if root == None:
+        print 'No Magento installation found for {path}'.format(path=path)
+        return 1
+
+    use_project(root, options.tokenizer)
+    engine.environment.settings['trace_completions'] = options.trace
+    intel = engine.CompletionEngine()
+    wait_for_indexes(intel)
+
+    code = codecs.open(path, encoding='utf-8', mode='r').read()
+    document = engine.Document(path, code, int(offset), os.path.abspath(path))
+
+    if options.profile:
+        import cProfile
+        import pstats
+        profile = cProfile.Profile()
+        data = profile.runcall(intel.find_completions, document)
+        pstats.Stats(profile).sort_stats('cumulative').print_stats(25)
+    else:
+        data = intel.find_completions(document)
+
+    for label, snippet in data:
+        print '{label}\t{snippet}'.format(label=label, snippet=snippet)
+
+    if options.trace:
+        print
+        print engine.format_traces(engine.traces)
+
+    return 0
+
+
+def write_file(root, path, text):
+    path = os.path.join(root, *path.split('/'))
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    f = open(path, 'w')
+    f.write(text)
+    f.close()
+
+
+def build_tree(root, modules, classes, methods):
+    '''
+    Write a synthetic Magento installation.
+
+    Each module has a config.xml declaring its model and helper aliases and
+    a chain of model classes, each extending the one before it, on top of
+    Mage_Core_Model_Abstract and Varien_Object.
+    '''
+    write_file(root, 'app/Mage.php', '<?php\nfinal class Mage\n{\n'
+        '    public static function getModel($modelClass = \'\', $arguments = array()) {}\n'
+        '    public static function helper($name) {}\n}\n')
+    write_file(root, 'lib/Varien/Object.php', '<?php\nclass Varien_Object\n{\n'
+        '    /**\n     * @return Varien_Object\n     */\n'
+        '    public function setData($key, $value = null)\n    {\n        return $this;\n    }\n\n'
+        '    public function getData($key = \'\', $index = null)\n    {\n    }\n}\n')
+    write_file(root, 'app/code/core/Mage/Core/Model/Abstract.php', '<?php\n'
+        'abstract class Mage_Core_Model_Abstract extends Varien_Object\n{\n'
+        '    /**\n     * @return $this\n     */\n'
+        '    public function load($id, $field = null)\n    {\n        return $this;\n    }\n}\n')
+
+    for m in range(0, modules):
+        module = 'Bench{m}'.format(m=m)
+        alias = module.lower()
+        write_file(root, 'app/code/core/Mage/{module}/etc/config.xml'.format(module=module),
+            '<?xml version="1.0"?>\n<config>\n    <global>\n'
+            '        <models><{alias}><class>Mage_{module}_Model</class></{alias}></models>\n'
+            '        <helpers><{alias}><class>Mage_{module}_Helper</class></{alias}></helpers>\n'
+            '    </global>\n</config>\n'.format(alias=alias, module=module))
+        write_file(root, 'app/code/core/Mage/{module}/Helper/Data.php'.format(module=module),
+            '<?php\nclass Mage_{module}_Helper_Data\n{{\n    public function isEnabled()\n    {{\n    }}\n}}\n'.format(
+            module=module))
+
+        parent = 'Mage_Core_Model_Abstract'
+        for c in range(0, classes):
+            className = 'Mage_{module}_Model_Item{c}'.format(module=module, c=c)
+            lines = ['<?php', 'class {name} extends {parent}'.format(name=className, parent=parent), '{']
+            for f in range(0, methods):
+                lines.append('    /**')
+                lines.append('     * Method {f} of {name}'.format(f=f, name=className))
+                lines.append('     *')
+                lines.append('     * @param string $value')
+                lines.append('     * @return {name}'.format(name=className))
+                lines.append('     */')
+                lines.append('    public function item{c}Method{f}($value, $options = array())'.format(c=c, f=f))
+                lines.append('    {')
+                lines.append('        $this->setData(\'method{f}\', $value);'.format(f=f))
+                lines.append('        return $this;')
+                lines.append('    }')
+                lines.append('')
+            lines.append('}')
+            write_file(root, 'app/code/core/Mage/{module}/Model/Item{c}.php'.format(module=module, c=c),
+                '\n'.join(lines) + '\n')
+            parent = className
+
+
+def bench_documents(modules, classes):
+    '''
+    Code to complete in the synthetic tree, one document per module.
+    '''
+    documents = []
+    for m in range(0, modules):
+        alias = 'bench{m}'.format(m=m)
+        c = (m * 7) % classes
+        code = u'\n'.join([
+            u'<?php',
+            u'class Mage_Bench_Test{m}'.format(m=m),
+            u'{',
+            u'    public function run(Mage_Bench{m}_Model_Item{c} $item)'.format(m=m, c=c),
+            u'    {',
+            u'        /* @var $model Mage_Bench{m}_Model_Item{c} */'.format(m=m, c=c),
+            u'        $model = Mage::getModel(\'{alias}/item{c}\');'.format(alias=alias, c=c),
+            u'        Mage::helper(\'{alias}\')->isEnabled();'.format(alias=alias),
+            u'        $model->load(1)->item{c}Method0(1)->'.format(c=c),
+        ])
+        documents.append(engine.Document('bench{m}'.format(m=m), code, len(code)))
+
+    return documents
+
+
+def time_completions(intel, documents):
+    '''
+    Complete each document once. Returns the latencies in milliseconds and
+    the class lookups and probes they made.
+    '''
+    intel.counters['lookups'] = 0
+    intel.counters['probes'] = 0
+    latencies = []
+    for document in documents:
+        start = time.time()
+        intel.find_completions(document)
+        latencies.append((time.time() - start) * 1000)
+
+    return latencies, intel.counters['lookups'], intel.counters['probes']
+
+
+def report(name, latencies, lookups, probes):
+    print '{name:<24} p50 {p50:8.2f} ms   p99 {p99:8.2f} ms   {probes:.2f} probes/lookup'.format(name=name,
+        p50=percentile(latencies, 50), p99=percentile(latencies, 99), probes=float(probes) / max(lookups, 1))
+
+
+def bench(options, args):
+    '''
+    Run the benchmark suite.
+    '''
+    root = options.root
+    temporary = None
+    if root == None:
+        temporary = tempfile.mkdtemp(prefix='magentointel-bench-')
+        root = temporary
+        start = time.time()
+        build_tree(root, options.modules, options.classes, BENCH_METHODS)
+        print 'Built a synthetic tree of {count} classes in {time:.2f} s'.format(
+            count=options.modules * options.classes, time=time.time() - start)
+
+    try:
+        use_project(root, options.tokenizer)
+        documents = bench_documents(options.modules, options.classes)
+
+        # Cold: nothing cached and the class index is still being built
+        latencies = []
+        lookups = 0
+        probes = 0
+        for i in range(0, options.runs):
+            reset_caches(root)
+            intel = engine.CompletionEngine()
+            result = time_completions(intel, documents[i % len(documents):] + documents[:i % len(documents)])
+            latencies.extend(result[0])
+            lookups += result[1]
+            probes += result[2]
+            wait_for_indexes(intel)
+        report('cold', latencies, lookups, probes)
+
+        # Warm: indexes built and symbols cached
+        latencies = []
+        lookups = 0
+        probes = 0
+        wait_for_indexes(intel)
+        time_completions(intel, documents)
+        for i in range(0, options.runs):
+            result = time_completions(intel, documents)
+            latencies.extend(result[0])
+            lookups += result[1]
+            probes += result[2]
+        report('warm', latencies, lookups, probes)
+
+        # Tokenizers, on the largest class file
+        path = max([os.path.join(folder, name) for folder, dirs, files in os.walk(os.path.join(root, 'app'))
+            for name in files if name.endswith('.php')], key=os.path.getsize)
+        code = open(path, 'rb').read()
+        for name in sorted(engine.tokenizers.keys()):
+            if name == 'php' and not engine.find_program('php'):
+                print 'tokenizer {name:<14} skipped, php is not on the path'.format(name=name)
+                continue
+            tokenizer = engine.tokenizers[name]
+            timings = []
+            for i in range(0, options.runs):
+                start = time.time()
+                tokens = tokenizer.tokenize(code)
+                timings.append((time.time() - start) * 1000)
+            print 'tokenizer {name:<14} p50 {p50:8.2f} ms   p99 {p99:8.2f} ms   {lines} lines, {count} tokens'.format(
+                name=name, p50=percentile(timings, 50), p99=percentile(timings, 99), lines=code.count('\n'),
+                count=len(tokens or []))
+    finally:
+        engine.tokenizers['php'].pool.stop()
+        if temporary:
+            shutil.rmtree(temporary)
+
+    return 0
+
+
+def process_map(processes):
+    '''
+    Make a mapper for SymbolIndex.refresh() that runs on a pool of
+    processes.
+    '''
+    def mapper(function, tasks):
+        pool = multiprocessing.Pool(processes, engine.start_index_process)
+        try:
+            for result in pool.imap_unordered(function, tasks, 16):
+                yield result
+        finally:
+            pool.terminate()
+
+    return mapper
+
+
+def index(options, args):
+    '''
+    Build or resume the symbol index of a Magento installation.
+    '''
+    root = options.root or find_root(os.path.join(os.getcwd(), 'index.php'))
+    if root == None:
+        print 'No Magento installation found, use --root'
+        return 1
+
+    use_project(root, options.tokenizer)
+    intel = engine.CompletionEngine()
+    symbols = intel.get_symbol_index()
+    symbols.load()
+
+    def progress(done, total):
+        if done % 500 == 0 or done == total:
+            print 'Indexed {done} of {total} files'.format(done=done, total=total)
+
+    start = time.time()
+    try:
+        symbols.refresh(process_map(options.processes), progress)
+    finally:
+        engine.tokenizers['php'].pool.stop()
+
+    print '{count} files in the index, updated in {time:.2f} s'.format(count=len(symbols.files),
+        time=time.time() - start)
+
+    return 0
+
+
+def deep_size(value, seen):
+    '''
+    Estimate the memory used by a value and everything it refers to,
+    counting shared objects once.
+    '''
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += deep_size(key, seen) + deep_size(item, seen)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += deep_size(item, seen)
+    elif isinstance(value, engine.Symbol):
+        for name in engine.Symbol.__slots__:
+            size += deep_size(getattr(value, name), seen)
+
+    return size
+
+
+def memory(options, args):
+    '''
+    Measure the memory taken by the symbol index of the core code pool,
+    compared with keeping each symbol as a dict along with its file's
+    source, as symbol tables used to be.
+    '''
+    root = options.root
+    temporary = None
+    if root == None:
+        temporary = tempfile.mkdtemp(prefix='magentointel-memory-')
+        root = temporary
+        build_tree(root, options.modules * 10, options.classes, BENCH_METHODS)
+
+    try:
+        use_project(root, options.tokenizer)
+        reset_caches(root)
+        intel = engine.CompletionEngine()
+        symbols = intel.get_symbol_index()
+        start = time.time()
+        symbols.refresh(process_map(options.processes))
+        print 'Indexed {count} files in {time:.2f} s'.format(count=len(symbols.files), time=time.time() - start)
+
+        # Load it the way the editor does, from the saved index
+        engine.symbol_strings.clear()
+        loaded = engine.SymbolIndex(root, symbols.cachefile)
+        loaded.load()
+
+        core = []
+        for path, entry in loaded.files.items():
+            if path.startswith(os.path.join('app', 'code', 'core') + os.sep):
+                core.append((path, entry))
+
+        count = 0
+        compact = deep_size(engine.symbol_strings, set())
+        seen = set([id(engine.symbol_strings)])
+        plain = 0
+        source = 0
+        for path, entry in core:
+            compact += deep_size(entry, seen)
+            table = {}
+            for name, symbol in entry[3].items():
+                table[name[:]] = {'kind': symbol.kind, 'args': list(symbol.args), 'returnType': symbol.returnType,
+                    'visibility': symbol.visibility, 'static': symbol.static, 'class': symbol.className}
+                count += 1
+            plain += deep_size(table, set())
+            source += os.path.getsize(os.path.join(root, path))
+
+        print '{files} core files, {count} symbols'.format(files=len(core), count=count)
+        print 'compact index      {size:8.2f} MB   {each:6.0f} bytes/symbol'.format(size=compact / 1048576.0,
+            each=float(compact) / max(count, 1))
+        print 'symbol dicts       {size:8.2f} MB   {each:6.0f} bytes/symbol, plus {source:.2f} MB of source'.format(
+            size=plain / 1048576.0, each=float(plain) / max(count, 1), source=source / 1048576.0)
+    finally:
+        engine.tokenizers['php'].pool.stop()
+        if temporary:
+            shutil.rmtree(temporary)
+
+    return 0
+
+
+def attributes(options, args):
+    '''
+    Import the attribute map of a Magento installation.
+    '''
+    root = options.root or find_root(os.path.join(os.getcwd(), 'index.php'))
+    if root == None:
+        print 'No Magento installation found, use --root'
+        return 1
+
+    use_project(root, options.tokenizer)
+    intel = engine.CompletionEngine()
+    wait_for_indexes(intel)
+    imported = intel.get_attribute_map()
+    imported.schema = options.schema
+
+    start = time.time()
+    imported.refresh()
+    for key in sorted(imported.entities.keys()):
+        print '{key:<40} {count} attributes'.format(key=key, count=len(imported.entities[key]))
+    print 'Imported the attributes of {count} entities in {time:.2f} s'.format(count=len(imported.entities),
+        time=time.time() - start)
+
+    return 0
+
+
+def main(argv):
+    parser = OptionParser(usage='%prog complete FILE:OFFSET | bench | index | memory | attributes [options]')
+    parser.add_option('--root', help='Magento installation folder')
+    parser.add_option('--tokenizer', choices=['php', 'python'],
+        help='tokenizer to use (default: php if it is on the path, otherwise python)')
+    parser.add_option('--profile', action='store_true', help='complete: print a profile of the lookup')
+    parser.add_option('--trace', action='store_true', default=False,
+        help='complete: print the time spent in each phase of the lookup')
+    parser.add_option('--runs', type='int', default=BENCH_RUNS, help='bench: repetitions per measurement')
+    parser.add_option('--modules', type='int', default=BENCH_MODULES, help='bench: modules in the synthetic tree')
+    parser.add_option('--classes', type='int', default=BENCH_CLASSES, help='bench: classes per module')
+    parser.add_option('--processes', type='int', default=multiprocessing.cpu_count(),
+        help='index, memory: worker processes (default: one per CPU)')
+    parser.add_option('--schema', help='attributes: schema dump to import as well')
+    options, args = parser.parse_args(argv)
+
+    if options.tokenizer == None:
+        options.tokenizer = engine.find_program('php') and 'php' or 'python'
+
+    if args and args[0] == 'complete':
+        return complete(options, args[1:])
+    if args and args[0] == 'bench':
+        return bench(options, args[1:])
+    if args and args[0] == 'index':
+        return index(options, args[1:])
+    if args and args[0] == 'memory':
+        return memory(options, args[1:])
+    if args and args[0] == 'attributes':
+        return attributes(options, args[1:])
+
+    parser.print_usage()
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
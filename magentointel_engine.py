@@ -0,0 +1,4074 @@
+# -*- coding: utf-8 -*-
+
+'''
+MagentoIntel completion engine
+
+Everything that doesn't need the editor: tokenizers, indexes, caches and
+completion lookup. It can run outside Sublime Text, see magentointel_cli.py.
+
+Copyright 2012 John Watson <https://github.com/jotson>
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+'''
+
+import os
+import re
+import glob
+import json
+import codecs
+import subprocess
+import hashlib
+import struct
+import zlib
+import array
+import time
+import bisect
+import threading
+import collections
+import Queue
+from xml.etree import ElementTree
+from xml.parsers.expat import ExpatError
+
+
+'''
+PHP program run by each tokenizer worker.
+
+On startup the worker reports the PHP version and the names of its token
+codes. Then requests are framed as a decimal byte count on its own line
+followed by that many bytes of source code. Responses use the same framing
+around the JSON encoded result of token_get_all(). The worker exits when
+stdin is closed.
+'''
+TOKENIZER_WORKER = '''
+$names = array();
+for ($i = 0; $i < 1000; $i++) {
+    $name = token_name($i);
+    if ($name != 'UNKNOWN') {
+        $names[$i] = $name;
+    }
+}
+$out = json_encode(array('version' => PHP_VERSION, 'names' => $names));
+fwrite(STDOUT, strlen($out) . "\\n" . $out);
+fflush(STDOUT);
+
+while (($header = fgets(STDIN)) !== false) {
+    $length = (int) $header;
+    $code = '';
+    while (strlen($code) < $length && !feof(STDIN)) {
+        $code .= fread(STDIN, $length - strlen($code));
+    }
+    $out = json_encode(token_get_all($code));
+    if ($out === false) {
+        $out = 'null';
+    }
+    fwrite(STDOUT, strlen($out) . "\\n" . $out);
+    fflush(STDOUT);
+}
+'''
+
+TOKENIZER_WORKERS = 2
+
+
+class TokenizerWorker(object):
+    '''
+    A long-lived PHP process that tokenizes code sent to it over stdin.
+
+    The process is started on first use and restarted if it dies.
+    '''
+
+    def __init__(self, php='php'):
+        self.php = php
+        self.process = None
+        self.info = None
+        self.lock = threading.Lock()
+
+    def start(self):
+        '''
+        Start the PHP process. Its warnings, like the scanner's "Unterminated
+        comment", go to stderr so they can't end up inside a response.
+        '''
+        trace_count('php processes started')
+        self.process = subprocess.Popen([self.php, '-d', 'display_errors=stderr', '-r', TOKENIZER_WORKER], bufsize=-1,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, shell=False)
+        self.info = self.read()
+
+    def stop(self):
+        if self.process:
+            try:
+                self.process.stdin.close()
+                self.process.kill()
+                self.process.wait()
+            except (IOError, OSError):
+                pass
+        self.process = None
+
+    def tokenize(self, code):
+        '''
+        Tokenize UTF-8 encoded code.
+
+        Returns None if the worker fails twice in a row.
+        '''
+        return self.call(self.request, code)
+
+    def describe(self):
+        '''
+        Get the PHP version and token names the worker reported when it
+        started, as {'version': ..., 'names': {code: name}}.
+
+        Returns None if the worker can't be started.
+        '''
+        return self.call(lambda: self.info)
+
+    def call(self, method, *args):
+        '''
+        Call method with the worker running, restarting it once if it fails.
+        '''
+        self.lock.acquire()
+        try:
+            for attempt in range(0, 2):
+                try:
+                    if self.process == None or self.process.poll() != None:
+                        self.start()
+                    return method(*args)
+                except (IOError, OSError, ValueError):
+                    self.stop()
+            return None
+        finally:
+            self.lock.release()
+
+    def request(self, code):
+        trace_count('php requests')
+        self.process.stdin.write('{length}\n'.format(length=len(code)))
+        self.process.stdin.write(code)
+        self.process.stdin.flush()
+
+        return self.read()
+
+    def read(self):
+        header = self.process.stdout.readline()
+        if not header:
+            raise IOError('Tokenizer worker exited')
+        length = int(header)
+        result = self.process.stdout.read(length)
+        if len(result) < length:
+            raise IOError('Tokenizer worker exited')
+
+        return json.loads(result)
+
+
+class TokenizerPool(object):
+    '''
+    A fixed-size pool of tokenizer workers shared by all callers.
+    '''
+
+    def __init__(self, size=TOKENIZER_WORKERS, php='php'):
+        self.idle = Queue.Queue()
+        self.workers = []
+        for i in range(0, size):
+            worker = TokenizerWorker(php)
+            self.workers.append(worker)
+            self.idle.put(worker)
+
+    def tokenize(self, code):
+        worker = self.idle.get()
+        try:
+            return worker.tokenize(code)
+        finally:
+            self.idle.put(worker)
+
+    def describe(self):
+        for worker in self.workers:
+            if worker.info != None:
+                return worker.info
+
+        worker = self.idle.get()
+        try:
+            return worker.describe()
+        finally:
+            self.idle.put(worker)
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+
+
+'''
+Token names produced by the pure Python lexer.
+
+PHP's own token codes vary between versions so the lexer numbers its tokens
+itself. Callers only ever deal with the names.
+'''
+PHP_TOKEN_NAMES = (
+    'T_ABSTRACT', 'T_AND_EQUAL', 'T_ARRAY', 'T_ARRAY_CAST', 'T_AS', 'T_BOOLEAN_AND', 'T_BOOLEAN_OR',
+    'T_BOOL_CAST', 'T_BREAK', 'T_CALLABLE', 'T_CASE', 'T_CATCH', 'T_CLASS', 'T_CLASS_C', 'T_CLONE',
+    'T_CLOSE_TAG', 'T_COALESCE', 'T_COMMENT', 'T_CONCAT_EQUAL', 'T_CONST', 'T_CONSTANT_ENCAPSED_STRING',
+    'T_CONTINUE', 'T_CURLY_OPEN', 'T_DEC', 'T_DECLARE', 'T_DEFAULT', 'T_DIR', 'T_DIV_EQUAL', 'T_DNUMBER',
+    'T_DOC_COMMENT', 'T_DO', 'T_DOLLAR_OPEN_CURLY_BRACES', 'T_DOUBLE_ARROW', 'T_DOUBLE_CAST',
+    'T_DOUBLE_COLON', 'T_ECHO', 'T_ELLIPSIS', 'T_ELSE', 'T_ELSEIF', 'T_EMPTY', 'T_ENCAPSED_AND_WHITESPACE',
+    'T_ENDDECLARE', 'T_ENDFOR', 'T_ENDFOREACH', 'T_ENDIF', 'T_ENDSWITCH', 'T_ENDWHILE', 'T_END_HEREDOC',
+    'T_EVAL', 'T_EXIT', 'T_EXTENDS', 'T_FILE', 'T_FINAL', 'T_FINALLY', 'T_FOR', 'T_FOREACH', 'T_FUNCTION',
+    'T_FUNC_C', 'T_GLOBAL', 'T_GOTO', 'T_HALT_COMPILER', 'T_IF', 'T_IMPLEMENTS', 'T_INC', 'T_INCLUDE',
+    'T_INCLUDE_ONCE', 'T_INLINE_HTML', 'T_INSTANCEOF', 'T_INSTEADOF', 'T_INTERFACE', 'T_INT_CAST',
+    'T_ISSET', 'T_IS_EQUAL', 'T_IS_GREATER_OR_EQUAL', 'T_IS_IDENTICAL', 'T_IS_NOT_EQUAL',
+    'T_IS_NOT_IDENTICAL', 'T_IS_SMALLER_OR_EQUAL', 'T_LINE', 'T_LIST', 'T_LNUMBER', 'T_LOGICAL_AND',
+    'T_LOGICAL_OR', 'T_LOGICAL_XOR', 'T_METHOD_C', 'T_MINUS_EQUAL', 'T_MOD_EQUAL', 'T_MUL_EQUAL',
+    'T_NAMESPACE', 'T_NEW', 'T_NS_C', 'T_NS_SEPARATOR', 'T_NUM_STRING', 'T_OBJECT_CAST',
+    'T_OBJECT_OPERATOR', 'T_OPEN_TAG', 'T_OPEN_TAG_WITH_ECHO', 'T_OR_EQUAL', 'T_PLUS_EQUAL', 'T_POW',
+    'T_POW_EQUAL', 'T_PRINT', 'T_PRIVATE', 'T_PROTECTED', 'T_PUBLIC', 'T_REQUIRE', 'T_REQUIRE_ONCE',
+    'T_RETURN', 'T_SL', 'T_SL_EQUAL', 'T_SPACESHIP', 'T_SR', 'T_SR_EQUAL', 'T_START_HEREDOC', 'T_STATIC',
+    'T_STRING', 'T_STRING_CAST', 'T_STRING_VARNAME', 'T_SWITCH', 'T_THROW', 'T_TRAIT', 'T_TRAIT_C',
+    'T_TRY', 'T_UNSET', 'T_UNSET_CAST', 'T_USE', 'T_VAR', 'T_VARIABLE', 'T_WHILE', 'T_WHITESPACE',
+    'T_XOR_EQUAL', 'T_YIELD',
+)
+
+PHP_TOKEN_CODES = dict((name, 258 + i) for i, name in enumerate(PHP_TOKEN_NAMES))
+
+PHP_KEYWORDS = {
+    'abstract': 'T_ABSTRACT', 'and': 'T_LOGICAL_AND', 'array': 'T_ARRAY', 'as': 'T_AS',
+    'break': 'T_BREAK', 'callable': 'T_CALLABLE', 'case': 'T_CASE', 'catch': 'T_CATCH',
+    'class': 'T_CLASS', 'clone': 'T_CLONE', 'const': 'T_CONST', 'continue': 'T_CONTINUE',
+    'declare': 'T_DECLARE', 'default': 'T_DEFAULT', 'die': 'T_EXIT', 'do': 'T_DO', 'echo': 'T_ECHO',
+    'else': 'T_ELSE', 'elseif': 'T_ELSEIF', 'empty': 'T_EMPTY', 'enddeclare': 'T_ENDDECLARE',
+    'endfor': 'T_ENDFOR', 'endforeach': 'T_ENDFOREACH', 'endif': 'T_ENDIF',
+    'endswitch': 'T_ENDSWITCH', 'endwhile': 'T_ENDWHILE', 'eval': 'T_EVAL', 'exit': 'T_EXIT',
+    'extends': 'T_EXTENDS', 'final': 'T_FINAL', 'finally': 'T_FINALLY', 'for': 'T_FOR',
+    'foreach': 'T_FOREACH', 'function': 'T_FUNCTION', 'global': 'T_GLOBAL', 'goto': 'T_GOTO',
+    'if': 'T_IF', 'implements': 'T_IMPLEMENTS', 'include': 'T_INCLUDE',
+    'include_once': 'T_INCLUDE_ONCE', 'instanceof': 'T_INSTANCEOF', 'insteadof': 'T_INSTEADOF',
+    'interface': 'T_INTERFACE', 'isset': 'T_ISSET', 'list': 'T_LIST', 'namespace': 'T_NAMESPACE',
+    'new': 'T_NEW', 'or': 'T_LOGICAL_OR', 'print': 'T_PRINT', 'private': 'T_PRIVATE',
+    'protected': 'T_PROTECTED', 'public': 'T_PUBLIC', 'require': 'T_REQUIRE',
+    'require_once': 'T_REQUIRE_ONCE', 'return': 'T_RETURN', 'static': 'T_STATIC',
+    'switch': 'T_SWITCH', 'throw': 'T_THROW', 'trait': 'T_TRAIT', 'try': 'T_TRY',
+    'unset': 'T_UNSET', 'use': 'T_USE', 'var': 'T_VAR', 'while': 'T_WHILE', 'xor': 'T_LOGICAL_XOR',
+    'yield': 'T_YIELD', '__class__': 'T_CLASS_C', '__dir__': 'T_DIR', '__file__': 'T_FILE',
+    '__function__': 'T_FUNC_C', '__halt_compiler': 'T_HALT_COMPILER', '__line__': 'T_LINE',
+    '__method__': 'T_METHOD_C', '__namespace__': 'T_NS_C', '__trait__': 'T_TRAIT_C',
+}
+
+PHP_CASTS = {
+    'int': 'T_INT_CAST', 'integer': 'T_INT_CAST', 'bool': 'T_BOOL_CAST', 'boolean': 'T_BOOL_CAST',
+    'float': 'T_DOUBLE_CAST', 'double': 'T_DOUBLE_CAST', 'real': 'T_DOUBLE_CAST',
+    'string': 'T_STRING_CAST', 'binary': 'T_STRING_CAST', 'array': 'T_ARRAY_CAST',
+    'object': 'T_OBJECT_CAST', 'unset': 'T_UNSET_CAST',
+}
+
+PHP_OPERATORS = {
+    '<<=': 'T_SL_EQUAL', '>>=': 'T_SR_EQUAL', '**=': 'T_POW_EQUAL', '===': 'T_IS_IDENTICAL',
+    '!==': 'T_IS_NOT_IDENTICAL', '<=>': 'T_SPACESHIP', '...': 'T_ELLIPSIS',
+    '->': 'T_OBJECT_OPERATOR', '=>': 'T_DOUBLE_ARROW', '::': 'T_DOUBLE_COLON', '==': 'T_IS_EQUAL',
+    '!=': 'T_IS_NOT_EQUAL', '<>': 'T_IS_NOT_EQUAL', '<=': 'T_IS_SMALLER_OR_EQUAL',
+    '>=': 'T_IS_GREATER_OR_EQUAL', '++': 'T_INC', '--': 'T_DEC', '+=': 'T_PLUS_EQUAL',
+    '-=': 'T_MINUS_EQUAL', '*=': 'T_MUL_EQUAL', '/=': 'T_DIV_EQUAL', '.=': 'T_CONCAT_EQUAL',
+    '%=': 'T_MOD_EQUAL', '&=': 'T_AND_EQUAL', '|=': 'T_OR_EQUAL', '^=': 'T_XOR_EQUAL',
+    '<<': 'T_SL', '>>': 'T_SR', '&&': 'T_BOOLEAN_AND', '||': 'T_BOOLEAN_OR', '**': 'T_POW',
+    '??': 'T_COALESCE', '\\': 'T_NS_SEPARATOR',
+}
+
+
+def any_case(word):
+    '''
+    Build a case insensitive pattern for a word.
+    '''
+    return u''.join([u'[' + c.lower() + c.upper() + u']' for c in word])
+
+
+PHP_LABEL = u'[a-zA-Z_\x7f-\uffff][a-zA-Z0-9_\x7f-\uffff]*'
+
+PHP_SCANNER = re.compile(u'|'.join([
+    u'(?P<whitespace>[ \\t\\r\\n]+)',
+    u'(?P<close>\\?>(?:\\r\\n|\\n|\\r)?)',
+    u'(?P<comment>(?:#|//)(?:[^\\r\\n?]|\\?(?!>))*(?:\\r\\n|\\n|\\r)?)',
+    u'(?P<doc>/\\*\\*[ \\t\\r\\n].*?(?:\\*/|\\Z))',
+    u'(?P<block>/\\*.*?(?:\\*/|\\Z))',
+    u'(?P<variable>\\$' + PHP_LABEL + u')',
+    u"(?P<sqstring>[bB]?'(?:[^'\\\\]|\\\\.)*')",
+    u"(?P<unterminated>[bB]?'.*)",
+    u'(?P<dqstring>[bB]?"(?:[^"\\\\${]|\\\\.|\\$(?![a-zA-Z_\x7f-\uffff{])|\\{(?!\\$))*")',
+    u'(?P<quote>[bB]?"|`)',
+    u'(?P<heredoc>[bB]?<<<[ \\t]*(?:"?(?P<label_heredoc>' + PHP_LABEL + u')"?|\'(?P<label_nowdoc>' + PHP_LABEL + u')\')(?:\\r\\n|\\n|\\r))',
+    u'(?P<label>' + PHP_LABEL + u')',
+    u'(?P<dnumber>(?:[0-9]*\\.[0-9]+|[0-9]+\\.[0-9]*)(?:[eE][+-]?[0-9]+)?|[0-9]+[eE][+-]?[0-9]+)',
+    u'(?P<lnumber>0[xX][0-9a-fA-F]+|0[bB][01]+|[0-9]+)',
+    u'(?P<cast>\\([ \\t]*(?:' + u'|'.join([any_case(c) for c in PHP_CASTS.keys()]) + u')[ \\t]*\\))',
+    u'(?P<operator>' + u'|'.join([re.escape(o) for o in sorted(PHP_OPERATORS.keys(), key=len, reverse=True)]) + u')',
+    u'(?P<char>.)',
+]), re.DOTALL)
+
+PHP_OPEN_TAG = re.compile(u'<\\?(?:[pP][hH][pP](?:[ \\t]|\\r\\n|\\n|\\r)|=)?')
+
+PHP_ENCAPS_VARIABLE = re.compile(u'\\$(' + PHP_LABEL + u')')
+
+PHP_ENCAPS_OFFSET = re.compile(u'\\[(?:(-?[0-9]+)|(' + PHP_LABEL + u')|(\\$' + PHP_LABEL + u'))\\]')
+
+PHP_ENCAPS_PROPERTY = re.compile(u'->(' + PHP_LABEL + u')')
+
+PHP_VARNAME = re.compile(PHP_LABEL + u'(?=[\\[}])')
+
+
+class PhpLexer(object):
+    '''
+    Pure Python implementation of PHP's token_get_all().
+
+    Tokens come back in the same shape PHP returns them: [code, text, line]
+    lists for named tokens and bare strings for single characters. Codes map
+    to names through PHP_TOKEN_NAMES instead of PHP's token_name().
+    '''
+
+    def __init__(self, code, line=1):
+        self.code = code
+        self.pos = 0
+        self.line = line
+        self.tokens = []
+
+    def tokenize(self, inline=True):
+        '''
+        Tokenize the code.
+
+        With inline=False the code is assumed to start inside a <?php block.
+        '''
+        html = inline
+        while self.pos < len(self.code):
+            if html:
+                self.scan_html()
+            else:
+                self.scan_php()
+            html = not html
+
+        return self.tokens
+
+    def emit(self, name, text):
+        if name == None:
+            self.tokens.append(text)
+        else:
+            self.tokens.append([PHP_TOKEN_CODES[name], text, self.line])
+        self.line += text.count('\n')
+        self.pos += len(text)
+
+    def scan_html(self):
+        start = self.code.find('<?', self.pos)
+        if start < 0:
+            start = len(self.code)
+        if start > self.pos:
+            self.emit('T_INLINE_HTML', self.code[self.pos:start])
+        if start < len(self.code):
+            tag = PHP_OPEN_TAG.match(self.code, start).group(0)
+            if tag == '<?=':
+                self.emit('T_OPEN_TAG_WITH_ECHO', tag)
+            else:
+                self.emit('T_OPEN_TAG', tag)
+
+    def scan_php(self, nested=False):
+        '''
+        Scan PHP code until a closing tag.
+
+        When nested is True the code is an expression embedded in a string
+        and scanning stops after the closing brace.
+        '''
+        depth = 0
+        previous = None
+        code = self.code
+        while self.pos < len(code):
+            match = PHP_SCANNER.match(code, self.pos)
+            group = match.lastgroup
+            text = match.group(0)
+
+            if group == 'whitespace':
+                self.emit('T_WHITESPACE', text)
+                continue
+            elif group == 'close':
+                self.emit('T_CLOSE_TAG', text)
+                return
+            elif group == 'comment' or group == 'block':
+                # Only whitespace can come between -> and a property name
+                self.emit('T_COMMENT', text)
+                previous = 'T_COMMENT'
+                continue
+            elif group == 'doc':
+                self.emit('T_DOC_COMMENT', text)
+                previous = 'T_DOC_COMMENT'
+                continue
+            elif group == 'variable':
+                name = 'T_VARIABLE'
+            elif group == 'label':
+                name = 'T_STRING'
+                if previous != 'T_OBJECT_OPERATOR':
+                    name = PHP_KEYWORDS.get(text.lower(), 'T_STRING')
+            elif group == 'dnumber':
+                name = 'T_DNUMBER'
+            elif group == 'lnumber':
+                name = 'T_LNUMBER'
+            elif group == 'cast':
+                name = PHP_CASTS[text[1:-1].strip().lower()]
+            elif group == 'sqstring' or group == 'dqstring':
+                name = 'T_CONSTANT_ENCAPSED_STRING'
+            elif group == 'unterminated':
+                name = 'T_ENCAPSED_AND_WHITESPACE'
+            elif group == 'quote':
+                self.emit(None, text)
+                self.scan_encaps(text[-1])
+                previous = None
+                continue
+            elif group == 'heredoc':
+                self.scan_heredoc(text, match.group('label_heredoc'), match.group('label_nowdoc'))
+                previous = 'T_END_HEREDOC'
+                continue
+            elif group == 'operator':
+                name = PHP_OPERATORS[text]
+            else:
+                name = None
+                if text == '{':
+                    depth += 1
+                elif text == '}':
+                    if nested and depth == 0:
+                        self.emit(None, text)
+                        return
+                    depth -= 1
+
+            self.emit(name, text)
+            previous = name
+
+    def scan_heredoc(self, text, label, nowdoc):
+        self.emit('T_START_HEREDOC', text)
+        label = label or nowdoc
+        end = re.compile(u'^' + re.escape(label) + u'(?![a-zA-Z0-9_\x7f-\uffff])', re.MULTILINE)
+        found = None
+        while self.pos < len(self.code):
+            found = end.search(self.code, self.pos)
+            if found:
+                stop = found.start()
+            else:
+                stop = len(self.code)
+
+            if nowdoc:
+                if stop > self.pos:
+                    self.emit('T_ENCAPSED_AND_WHITESPACE', self.code[self.pos:stop])
+                break
+
+            # An embedded {$...} expression can run past the closing label
+            self.scan_encaps(None, stop)
+            if self.pos <= stop:
+                break
+            found = None
+
+        if found:
+            self.emit('T_END_HEREDOC', label)
+
+    def scan_encaps(self, quote, stop=None):
+        '''
+        Scan the body of an interpolated string up to its closing quote, or
+        up to stop for heredocs.
+        '''
+        code = self.code
+        if stop == None:
+            stop = len(code)
+        literal = self.pos
+        while self.pos < stop:
+            char = code[self.pos]
+            if char == quote:
+                break
+            elif char == '\\':
+                self.pos = min(self.pos + 2, stop)
+                continue
+
+            variable = None
+            if char == '$':
+                variable = PHP_ENCAPS_VARIABLE.match(code, self.pos, stop)
+            if variable:
+                self.flush_literal(literal)
+                self.emit('T_VARIABLE', variable.group(0))
+                offset = PHP_ENCAPS_OFFSET.match(code, self.pos, stop)
+                prop = PHP_ENCAPS_PROPERTY.match(code, self.pos, stop)
+                if offset:
+                    self.emit(None, '[')
+                    if offset.group(1) != None:
+                        number = offset.group(1)
+                        if number.startswith('-'):
+                            self.emit(None, '-')
+                            number = number[1:]
+                        self.emit('T_NUM_STRING', number)
+                    elif offset.group(2) != None:
+                        self.emit('T_STRING', offset.group(2))
+                    else:
+                        self.emit('T_VARIABLE', offset.group(3))
+                    self.emit(None, ']')
+                elif prop:
+                    self.emit('T_OBJECT_OPERATOR', '->')
+                    self.emit('T_STRING', prop.group(1))
+                literal = self.pos
+            elif code.startswith('{$', self.pos):
+                self.flush_literal(literal)
+                self.emit('T_CURLY_OPEN', '{')
+                self.scan_php(nested=True)
+                literal = self.pos
+            elif code.startswith('${', self.pos):
+                self.flush_literal(literal)
+                self.emit('T_DOLLAR_OPEN_CURLY_BRACES', '${')
+                varname = PHP_VARNAME.match(code, self.pos, stop)
+                if varname:
+                    self.emit('T_STRING_VARNAME', varname.group(0))
+                self.scan_php(nested=True)
+                literal = self.pos
+            else:
+                self.pos += 1
+
+        self.flush_literal(literal)
+        if self.pos < len(code) and code[self.pos] == quote:
+            self.emit(None, quote)
+
+    def flush_literal(self, start):
+        end = self.pos
+        if end > start:
+            self.pos = start
+            self.emit('T_ENCAPSED_AND_WHITESPACE', self.code[start:end])
+
+
+class PhpTokenizer(object):
+    '''
+    Tokenizer backend that runs PHP's token_get_all() in worker processes.
+    '''
+
+    name = 'php'
+
+    def __init__(self):
+        self.pool = TokenizerPool()
+        self.binary = None
+        self.version = None
+
+    def stamp(self):
+        '''
+        Identify the PHP binary on the path by its location, modification
+        time and size, without running it. Returns None if there's no PHP.
+        '''
+        if self.binary == None:
+            self.binary = ''
+            path = find_program('php')
+            if path:
+                stat = os.stat(path)
+                self.binary = '{path}:{mtime}:{size}'.format(path=os.path.realpath(path), mtime=stat.st_mtime,
+                    size=stat.st_size)
+
+        return self.binary or None
+
+    def tokenize(self, code):
+        return self.pool.tokenize(code)
+
+    def tokenize_fragment(self, code):
+        '''
+        Tokenize code that starts inside a <?php block.
+        '''
+        tokens = self.tokenize('<?php ' + code)
+        if not tokens:
+            return []
+
+        return tokens[1:]
+
+    def token_names(self):
+        '''
+        Gets names for all token constants.
+
+        The token constants (http://us2.php.net/manual/en/tokens.php) values
+        aren't consistent between different versions of PHP. The values are
+        automatically generated based on PHP's underlying parser infrastructure.
+        This code generates a dictionary of token constants from the installed
+        version of PHP. The dictionary is later used to convert the token codes
+        returned by PHP's token_get_all() into names. A tokenizer worker
+        reports it when it starts.
+        '''
+        info = self.pool.describe()
+        if info == None:
+            return {}
+
+        self.version = info['version']
+        return info['names']
+
+
+class PythonTokenizer(object):
+    '''
+    Tokenizer backend that uses PhpLexer and doesn't need PHP at all.
+    '''
+
+    name = 'python'
+
+    def stamp(self):
+        return None
+
+    def tokenize(self, code):
+        return PhpLexer(code.decode('utf-8')).tokenize()
+
+    def tokenize_fragment(self, code):
+        return PhpLexer(code.decode('utf-8')).tokenize(inline=False)
+
+    def token_names(self):
+        constants = {}
+        for name, code in PHP_TOKEN_CODES.items():
+            constants[str(code)] = name
+
+        return constants
+
+
+tokenizers = {'php': PhpTokenizer(), 'python': PythonTokenizer()}
+
+
+def get_tokenizer():
+    '''
+    Get the tokenizer backend selected in the settings.
+    '''
+    return tokenizers.get(get_setting('tokenizer', 'php'), tokenizers['php'])
+
+
+def compare_tokens(tokens, names, otherTokens, otherNames):
+    '''
+    Compare two token lists by token name and text.
+
+    Returns the index of the first token that differs, or None if the lists
+    are the same.
+    '''
+    def normalize(token, names):
+        if type(token).__name__ == 'list':
+            return names.get(str(token[0])), token[1]
+        return None, token
+
+    for i in range(0, max(len(tokens), len(otherTokens))):
+        if i >= len(tokens) or i >= len(otherTokens):
+            return i
+        if normalize(tokens[i], names) != normalize(otherTokens[i], otherNames):
+            return i
+
+    return None
+
+
+'''
+Tokens that can't end a fragment that is re-tokenized on its own because the
+code that follows could extend them.
+'''
+OPEN_ENDED_TOKENS = ('T_WHITESPACE', 'T_ENCAPSED_AND_WHITESPACE', 'T_INLINE_HTML', 'T_START_HEREDOC',
+    'T_OBJECT_OPERATOR', 'T_SL', '(', '<')
+
+
+def find_safe_tokens(tokens, token, first=0, html=False):
+    '''
+    Find tokens that start at a safe boundary for re-tokenizing.
+
+    A safe boundary is a whitespace token in plain PHP code, where the lexer
+    is back in its initial state, that doesn't follow an open ended token.
+    The tokens are assumed to start in that state too, or in HTML if html is
+    True. Returns the indexes of the safe tokens (plus first), whether the
+    tokens end in the initial state, and the kind (or text, for single
+    characters) of the last token that isn't whitespace or a comment.
+    '''
+    safe = []
+    stack = []
+    previous = None
+    for i in range(0, len(tokens)):
+        kind, stmt = token(tokens[i])
+
+        if html:
+            if kind == 'T_OPEN_TAG' or kind == 'T_OPEN_TAG_WITH_ECHO':
+                html = False
+        elif not stack:
+            if kind == 'T_WHITESPACE':
+                if previous not in OPEN_ENDED_TOKENS:
+                    safe.append(first + i)
+                continue
+            elif kind == 'T_CLOSE_TAG':
+                html = True
+            elif kind == 'T_START_HEREDOC':
+                stack.append('heredoc')
+            elif kind == None and stmt in ('"', 'b"', 'B"', '`'):
+                stack.append(stmt[-1])
+        elif stack[-1] == '{':
+            if kind == None and stmt == '{':
+                stack.append('{')
+            elif kind == None and stmt == '}':
+                stack.pop()
+            elif kind == 'T_START_HEREDOC':
+                stack.append('heredoc')
+            elif kind == None and stmt in ('"', 'b"', 'B"', '`'):
+                stack.append(stmt[-1])
+        elif kind == 'T_CURLY_OPEN' or kind == 'T_DOLLAR_OPEN_CURLY_BRACES':
+            stack.append('{')
+        elif kind == 'T_END_HEREDOC' or (kind == None and stmt == stack[-1]):
+            stack.pop()
+
+        if kind != 'T_COMMENT' and kind != 'T_DOC_COMMENT':
+            previous = kind or stmt
+
+    return safe, not stack and not html, previous
+
+
+def is_closed_fragment(tokens, token, html=False):
+    '''
+    Check that tokenizing a fragment on its own gave the same tokens it
+    would have as part of the whole code.
+    '''
+    safe, closed, previous = find_safe_tokens(tokens, token, html=html)
+    if not closed:
+        return False
+    if not tokens:
+        return True
+
+    kind, stmt = token(tokens[-1])
+    if kind in OPEN_ENDED_TOKENS or (kind == None and stmt in OPEN_ENDED_TOKENS):
+        return False
+    if kind == 'T_COMMENT' and stmt.startswith('/*') and (len(stmt) < 4 or not stmt.endswith('*/')):
+        return False
+    if kind == 'T_COMMENT' and not stmt.startswith('/*') and not stmt.endswith('\n'):
+        return False
+    if kind == 'T_DOC_COMMENT' and (len(stmt) < 5 or not stmt.endswith('*/')):
+        return False
+
+    # The lexer remembers a -> across the whitespace and comments after it
+    if previous in OPEN_ENDED_TOKENS:
+        return False
+
+    # Labels can be part of a heredoc, cast or <?php tag that isn't complete yet
+    i = len(tokens) - 2
+    while i >= 0 and token(tokens[i])[0] == 'T_WHITESPACE':
+        i -= 1
+    if i >= 0 and token(tokens[i]) in ((None, '<'), (None, '('), ('T_OPEN_TAG', '<?')):
+        return False
+
+    return True
+
+
+def common_prefix_length(a, b):
+    '''
+    Length of the common prefix of two strings, found by binary search.
+    '''
+    low = 0
+    high = min(len(a), len(b))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[low:mid] == b[low:mid]:
+            low = mid
+        else:
+            high = mid - 1
+
+    return low
+
+
+def common_suffix_length(a, b, limit):
+    '''
+    Length of the common suffix of two strings, up to limit characters.
+    '''
+    low = 0
+    high = min(len(a), len(b), limit)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[len(a) - mid:len(a) - low] == b[len(b) - mid:len(b) - low]:
+            low = mid
+        else:
+            high = mid - 1
+
+    return low
+
+
+'''
+Patterns for @var hints in comments, in either order.
+'''
+VAR_HINT = re.compile(r'@var\s+(\$\w+)\s+\\?([\w\\]+)')
+VAR_HINT_REVERSED = re.compile(r'@var\s+\\?([\w\\]+)\s+(\$\w+)')
+
+
+def is_hint_mark(kind, stmt):
+    '''
+    Check if a token matters to the type hints of a buffer: a brace,
+    a function or a comment with an @var hint.
+    '''
+    if kind == None:
+        return stmt == '{' or stmt == '}'
+    if kind in ('T_DOC_COMMENT', 'T_COMMENT'):
+        return '@var' in stmt
+    return kind in ('T_FUNCTION', 'T_CURLY_OPEN', 'T_DOLLAR_OPEN_CURLY_BRACES')
+
+
+class HintIndex(object):
+    '''
+    Variable types declared in a buffer by @var hints and typed function
+    parameters, by scope.
+
+    Each function body is a scope. Hints outside any function belong to the
+    file. Looking up a variable checks the innermost function around a
+    point, then the functions around that, then the file.
+    '''
+
+    def __init__(self):
+        self.starts = []
+        self.scopes = []
+        self.file = {}
+
+    def build(self, tokens, offsets, marks, token):
+        '''
+        Collect the hints from the marked tokens.
+        '''
+        stack = []
+        bodies = {}
+        for i in marks:
+            kind, stmt = token(tokens[i])
+            if kind == 'T_FUNCTION':
+                body, params = self.read_function(tokens, i, token)
+                if body != None:
+                    bodies[body] = params
+            elif kind in ('T_DOC_COMMENT', 'T_COMMENT'):
+                if stack and stack[-1] != None:
+                    hints = self.scopes[stack[-1]][3]
+                else:
+                    hints = self.file
+                for name, type in VAR_HINT.findall(stmt):
+                    hints.setdefault(name, type)
+                for type, name in VAR_HINT_REVERSED.findall(stmt):
+                    hints.setdefault(name, type)
+            elif stmt == '}':
+                if stack:
+                    scope = stack.pop()
+                    if scope != None:
+                        self.scopes[scope][1] = offsets[i]
+            elif i in bodies:
+                parent = None
+                for scope in reversed(stack):
+                    if scope != None:
+                        parent = scope
+                        break
+                stack.append(len(self.scopes))
+                self.starts.append(offsets[i])
+                self.scopes.append([offsets[i], None, parent, bodies[i]])
+            else:
+                stack.append(None)
+
+    def read_function(self, tokens, i, token):
+        '''
+        Read the typed parameters of the function declared at tokens[i].
+
+        Returns the index of the brace that opens its body (or None if it has
+        no body) and the parameter types.
+        '''
+        params = {}
+        nest = 0
+        type = ''
+        i += 1
+        while i < len(tokens):
+            kind, stmt = token(tokens[i])
+            i += 1
+            if stmt == '(':
+                nest += 1
+            elif stmt == ')':
+                nest -= 1
+                if nest == 0:
+                    break
+            elif nest != 1:
+                continue
+            elif kind in ('T_STRING', 'T_NS_SEPARATOR'):
+                type += stmt
+            elif kind == 'T_VARIABLE':
+                if type:
+                    params[stmt] = type.lstrip('\\')
+                type = ''
+            elif stmt == ',' or stmt == '=':
+                type = ''
+
+        # Skip a return type or closure's use list to find the body
+        while i < len(tokens):
+            kind, stmt = token(tokens[i])
+            if stmt == '{':
+                return i, params
+            if stmt == '(':
+                nest += 1
+            elif stmt == ')':
+                nest -= 1
+            elif nest == 0 and kind not in ('T_WHITESPACE', 'T_COMMENT', 'T_DOC_COMMENT', 'T_STRING',
+                    'T_NS_SEPARATOR', 'T_USE', 'T_ARRAY') and stmt not in (':', '?'):
+                break
+            i += 1
+
+        return None, params
+
+    def find(self, name, point):
+        '''
+        Get the type of a variable at point.
+        '''
+        i = bisect.bisect_right(self.starts, point) - 1
+        while i != None and i >= 0:
+            start, end, parent, hints = self.scopes[i]
+            if end == None or point <= end:
+                if name in hints:
+                    return hints[name]
+            i = parent
+
+        return self.file.get(name)
+
+
+class BufferTokens(object):
+    '''
+    Tokens for a view's buffer, kept in sync as the buffer changes.
+
+    On each update the old and new code are diffed and only the code from the
+    last safe boundary before the change to the first safe boundary after it
+    is tokenized again. Tokens outside that range are reused. The tokens that
+    type hints depend on are tracked the same way, so the hint index can be
+    rebuilt from them without walking every token.
+    '''
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        '''
+        Drop all tokens, so the next update tokenizes the whole code.
+        '''
+        self.code = u''
+        self.tokens = []
+        self.offsets = []
+        self.safe = []
+        self.safeOffsets = []
+        self.marks = []
+        self.hints = None
+
+    def update(self, code, tokenize, token):
+        '''
+        Bring the tokens up to date with code.
+
+        tokenize(code, inline) tokenizes a fragment of code, starting in HTML
+        if inline is True or inside a <?php block otherwise. token(t)
+        converts a token into its kind and text.
+        '''
+        if code == self.code:
+            return
+
+        prefix = common_prefix_length(self.code, code)
+        suffix = common_suffix_length(self.code, code, min(len(self.code), len(code)) - prefix)
+        delta = len(code) - len(self.code)
+
+        # Restart from the last safe boundary before the change
+        i = bisect.bisect_left(self.safeOffsets, prefix) - 1
+        if i >= 0:
+            first = self.safe[i]
+            start = self.offsets[first]
+        else:
+            first = 0
+            start = 0
+
+        # Try to stop at the first safe boundary after the change
+        i = bisect.bisect_left(self.safeOffsets, len(self.code) - suffix)
+        if i < len(self.safe) and self.safe[i] > first:
+            last = self.safe[i]
+            end = self.offsets[last] + delta
+            fragment = self.tokenize_fragment(code[start:end], first, tokenize)
+            if fragment == None:
+                self.reset()
+                return
+            if is_closed_fragment(fragment, token, start == 0):
+                self.splice(code, first, last, start, fragment, token)
+                return
+
+        fragment = self.tokenize_fragment(code[start:], first, tokenize)
+        if fragment == None:
+            self.reset()
+            return
+        self.splice(code, first, len(self.tokens), start, fragment, token)
+
+    def tokenize_fragment(self, code, first, tokenize):
+        '''
+        Tokenize code that starts at the token with index first.
+
+        Returns None if the tokenizer failed, which it did if there's code
+        but no tokens.
+        '''
+        tokens = tokenize(code, first == 0)
+        if code and not tokens:
+            return None
+        if first == 0:
+            return tokens
+
+        line = self.tokens[first][2]
+        if line > 1:
+            for t in tokens:
+                if type(t).__name__ == 'list':
+                    t[2] += line - 1
+
+        return tokens
+
+    def splice(self, code, first, last, start, fragment, token):
+        '''
+        Replace tokens first..last with the tokens in fragment.
+        '''
+        offsets = []
+        marks = []
+        offset = start
+        for t in fragment:
+            kind, stmt = token(t)
+            if is_hint_mark(kind, stmt):
+                marks.append(first + len(offsets))
+            offsets.append(offset)
+            offset += len(stmt)
+
+        safe = find_safe_tokens(fragment, token, first, start == 0)[0]
+
+        tail = self.tokens[last:]
+        delta = len(code) - len(self.code)
+        shift = len(fragment) - (last - first)
+        i = bisect.bisect_left(self.safe, last)
+        if tail:
+            lines = code.count('\n', start, offset) - self.code.count('\n', start, self.offsets[last])
+            if lines:
+                for t in tail:
+                    if type(t).__name__ == 'list':
+                        t[2] += lines
+
+        j = bisect.bisect_left(self.safe, first)
+        self.safe = self.safe[:j] + safe + [s + shift for s in self.safe[i:]]
+        i = bisect.bisect_left(self.marks, last)
+        j = bisect.bisect_left(self.marks, first)
+        self.marks = self.marks[:j] + marks + [m + shift for m in self.marks[i:]]
+        self.hints = None
+        self.offsets = self.offsets[:first] + offsets + [o + delta for o in self.offsets[last:]]
+        self.safeOffsets = [self.offsets[s] for s in self.safe]
+        self.tokens = self.tokens[:first] + fragment + tail
+        self.code = code
+
+    def get_hints(self, token):
+        '''
+        Get the hint index for the current tokens.
+        '''
+        if self.hints == None:
+            self.hints = HintIndex()
+            self.hints.build(self.tokens, self.offsets, self.marks, token)
+
+        return self.hints
+
+    def tokens_before(self, point, tokenize):
+        '''
+        Get the tokens for the code before point.
+        '''
+        i = bisect.bisect_right(self.safeOffsets, point) - 1
+        if i < 0:
+            return self.tokenize_fragment(self.code[:point], 0, tokenize) or []
+
+        first = self.safe[i]
+        start = self.offsets[first]
+        fragment = self.tokenize_fragment(self.code[start:point], first, tokenize)
+        if fragment == None:
+            return []
+
+        return self.tokens[:first] + fragment
+
+
+'''
+Folders that classes are loaded from, in the order Magento's autoloader
+searches them. Only the PHP files directly inside app are indexed.
+'''
+CODE_POOLS = (
+    ('local', ('app', 'code', 'local')),
+    ('community', ('app', 'code', 'community')),
+    ('core', ('app', 'code', 'core')),
+    ('lib', ('lib',)),
+    ('app', ('app',)),
+)
+
+CLASS_DECLARATION = re.compile(r'^[ \t]*(?:(?:abstract|final)\s+)*(?:class|interface|trait)\s+(\w+)',
+    re.MULTILINE | re.IGNORECASE)
+
+CLASS_INDEX_VERSION = 1
+
+CLASS_INDEX_REFRESH = 60
+
+'''
+Name of the folder, in the Magento root, that caches are kept in.
+'''
+CACHE_FOLDER_NAME = '.magentointel-cache'
+
+'''
+How deep below a project folder to look for a Magento root, and folders
+that never hold one.
+'''
+PROJECT_SEARCH_DEPTH = 2
+PROJECT_SKIPPED_FOLDERS = ('node_modules', 'media', 'var', 'vendor')
+
+'''
+How long, in seconds, detected project details are trusted before they're
+checked again when a view is activated.
+'''
+PROJECT_RECHECK = 60
+
+MAGENTO_VERSION_PART = re.compile(r"'(major|minor|revision|patch)'\s*=>\s*'(\d+)'")
+MAGENTO_VERSION = re.compile(r"function getVersion\(\)\s*\{\s*return\s*'([\d.]+)'")
+
+projects = {}
+
+
+def find_magento_root(folder):
+    '''
+    Find the Magento root in a folder or the folders below it, nearest
+    first.
+    '''
+    candidates = [(folder, 0)]
+    while candidates:
+        path, depth = candidates.pop(0)
+        if os.path.isdir(os.path.join(path, 'app', 'code', 'core', 'Mage')):
+            return path
+        if depth >= PROJECT_SEARCH_DEPTH:
+            continue
+
+        try:
+            names = sorted(os.listdir(path))
+        except OSError:
+            continue
+        for name in names:
+            if name.startswith('.') or name in PROJECT_SKIPPED_FOLDERS:
+                continue
+            if os.path.isdir(os.path.join(path, name)):
+                candidates.append((os.path.join(path, name), depth + 1))
+
+    return None
+
+
+def read_magento_version(root):
+    '''
+    Read the Magento version from app/Mage.php.
+    '''
+    try:
+        source = codecs.open(os.path.join(root, 'app', 'Mage.php'), encoding='utf-8', mode='r',
+            errors='replace').read()
+    except IOError:
+        return None
+
+    parts = dict(MAGENTO_VERSION_PART.findall(source))
+    if 'major' in parts:
+        return '.'.join([parts.get(part, '0') for part in ('major', 'minor', 'revision', 'patch')])
+
+    found = MAGENTO_VERSION.search(source)
+    if found:
+        return found.group(1)
+
+    return None
+
+
+class Project(object):
+    '''
+    The Magento installation in a set of project folders: its root, the
+    code pools it has, where caches are kept and the Magento version.
+
+    root is None if the folders don't hold a Magento installation.
+    '''
+
+    def __init__(self, folders):
+        self.folders = folders
+        self.checked = time.time()
+        self.root = None
+        for folder in folders:
+            self.root = find_magento_root(folder)
+            if self.root:
+                break
+
+        self.cacheFolder = None
+        if self.root:
+            self.cacheFolder = os.path.join(self.root, CACHE_FOLDER_NAME)
+        elif folders:
+            self.cacheFolder = os.path.join(folders[0], CACHE_FOLDER_NAME)
+
+        self.pools = {}
+        self.version = None
+        if self.root:
+            for name, parts in CODE_POOLS:
+                path = os.path.join(self.root, *parts)
+                if os.path.isdir(path):
+                    self.pools[name] = path
+            self.version = read_magento_version(self.root)
+
+
+def get_project(refresh=False):
+    '''
+    Get the details of the Magento installation in the project folders.
+
+    They're detected the first time a set of folders is seen, so opening or
+    closing folders picks up a new project, and otherwise looking them up
+    doesn't touch the file system. With refresh=True they're detected again
+    if they're older than PROJECT_RECHECK.
+    '''
+    folders = tuple(window_folders())
+    project = projects.get(folders)
+    if project == None or (refresh and time.time() - project.checked > PROJECT_RECHECK):
+        project = Project(folders)
+        projects[folders] = project
+
+    return project
+
+
+class_indexes = {}
+
+
+class BackgroundIndex(object):
+    '''
+    Base for project indexes that are brought up to date by a refresh()
+    running in a background thread.
+    '''
+
+    def __init__(self):
+        self.refreshing = False
+        self.refreshed = 0
+        self.again = False
+        self.state = threading.Lock()
+
+    def refresh_in_background(self, force=False):
+        '''
+        Run refresh() in a background thread.
+
+        Unless force is True, does nothing if the index was refreshed recently.
+        A forced refresh requested while one is running runs again when it's
+        done, since files may have changed after it looked at them.
+        '''
+        self.state.acquire()
+        try:
+            if self.refreshing:
+                if force:
+                    self.again = True
+                return
+            if not force and time.time() - self.refreshed < CLASS_INDEX_REFRESH:
+                return
+
+            self.refreshing = True
+            self.refreshed = time.time()
+        finally:
+            self.state.release()
+
+        def run():
+            try:
+                while True:
+                    self.refresh()
+                    self.state.acquire()
+                    try:
+                        if not self.again:
+                            break
+                        self.again = False
+                        self.refreshed = time.time()
+                    finally:
+                        self.state.release()
+            finally:
+                self.refreshing = False
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+
+class ClassIndex(BackgroundIndex):
+    '''
+    Index of every class declared in a Magento installation.
+
+    Maps class names to the files that declare them and the code pool they
+    were found in. The index is saved in the cache folder and brought up to
+    date in the background by comparing file modification times, so looking
+    up a class is a dictionary lookup.
+    '''
+
+    def __init__(self, root, cachefile):
+        BackgroundIndex.__init__(self)
+        self.root = root
+        self.cachefile = cachefile
+        self.files = {}
+        self.classes = {}
+        self.vendorless = {}
+        self.listing = None
+        self.ready = False
+        self.lock = threading.Lock()
+
+    def load(self):
+        '''
+        Load the index saved by a previous session.
+        '''
+        try:
+            data = json.loads(codecs.open(self.cachefile, encoding='utf-8', mode='r').read())
+        except (IOError, ValueError):
+            return
+
+        if data.get('version') != CLASS_INDEX_VERSION:
+            return
+
+        self.lock.acquire()
+        try:
+            self.files = data['files']
+            self.rebuild()
+            self.ready = True
+        finally:
+            self.lock.release()
+
+    def save(self):
+        self.lock.acquire()
+        try:
+            data = json.dumps({'version': CLASS_INDEX_VERSION, 'files': self.files})
+        finally:
+            self.lock.release()
+
+        try:
+            codecs.open(self.cachefile, encoding='utf-8', mode='w').write(data)
+        except IOError:
+            pass
+
+    def rebuild(self):
+        '''
+        Rebuild the class lookup tables from the list of files.
+        '''
+        order = {}
+        for i, (pool, folders) in enumerate(CODE_POOLS):
+            order[pool] = i
+
+        classes = {}
+        for path, (mtime, pool, names) in self.files.items():
+            for name in names:
+                classes.setdefault(name, []).append((order[pool], path, pool))
+
+        vendorless = {}
+        for name, found in classes.items():
+            found.sort()
+            classes[name] = [(path, pool) for (i, path, pool) in found]
+            parts = name.split('_', 1)
+            if len(parts) == 2 and found[0][2] in ('local', 'community'):
+                vendorless.setdefault(parts[1], []).append((found[0][0], name))
+
+        for name, found in vendorless.items():
+            found.sort()
+            vendorless[name] = [n for (i, n) in found]
+
+        self.classes = classes
+        self.vendorless = vendorless
+        self.listing = None
+
+    def scan(self, path):
+        '''
+        Find the classes declared in a file.
+        '''
+        try:
+            source = codecs.open(os.path.join(self.root, path), encoding='utf-8', mode='r', errors='replace').read()
+        except IOError:
+            return []
+
+        return CLASS_DECLARATION.findall(source)
+
+    def walk(self):
+        '''
+        List the PHP files in each code pool with their modification times.
+        '''
+        found = {}
+        for pool, folders in CODE_POOLS:
+            base = os.path.join(self.root, *folders)
+            if pool == 'app':
+                walker = [(base, [], os.listdir(base))] if os.path.isdir(base) else []
+            else:
+                walker = os.walk(base)
+
+            for folder, subfolders, files in walker:
+                subfolders[:] = [f for f in subfolders if not f.startswith('.')]
+                for f in files:
+                    if not f.endswith('.php'):
+                        continue
+                    path = os.path.join(folder, f)
+                    try:
+                        mtime = os.path.getmtime(path)
+                    except OSError:
+                        continue
+                    found[os.path.relpath(path, self.root)] = (mtime, pool)
+
+        return found
+
+    def refresh(self):
+        '''
+        Bring the index up to date with the files on disk.
+
+        Only files that are new or have changed since the last refresh are
+        scanned again, and what's cached about them and the classes they
+        declare is forgotten.
+        '''
+        changed = []
+        classNames = set()
+        files = {}
+        for path, (mtime, pool) in self.walk().items():
+            known = self.files.get(path)
+            if known and known[0] == mtime and known[1] == pool:
+                files[path] = known
+            else:
+                files[path] = [mtime, pool, self.scan(path)]
+                changed.append(path)
+                classNames.update(files[path][2])
+                if known:
+                    classNames.update(known[2])
+
+        for path, known in self.files.items():
+            if path not in files:
+                changed.append(path)
+                classNames.update(known[2])
+
+        self.lock.acquire()
+        try:
+            self.files = files
+            if changed:
+                self.rebuild()
+            self.ready = True
+        finally:
+            self.lock.release()
+
+        if changed:
+            self.save()
+            forget_files([os.path.join(self.root, path) for path in changed], classNames)
+
+    def update_file(self, path):
+        '''
+        Update the index for a single file, e.g. after it was saved.
+        '''
+        path = os.path.relpath(path, self.root)
+        if path.startswith('..') or not path.endswith('.php'):
+            return
+
+        pool = None
+        for name, folders in CODE_POOLS:
+            folder = os.path.join(*folders)
+            if name == 'app':
+                if os.path.dirname(path) == folder:
+                    pool = name
+            elif path.startswith(folder + os.sep):
+                pool = name
+            if pool:
+                break
+        if pool == None:
+            return
+
+        try:
+            mtime = os.path.getmtime(os.path.join(self.root, path))
+        except OSError:
+            return
+
+        entry = [mtime, pool, self.scan(path)]
+        self.lock.acquire()
+        try:
+            self.files[path] = entry
+            self.rebuild()
+        finally:
+            self.lock.release()
+        self.save()
+
+    def list_classes(self):
+        '''
+        Get every class and the file it's loaded from, relative to the root,
+        sorted by name. The list is kept until the index changes.
+        '''
+        listing = self.listing
+        if listing == None:
+            listing = [[name, found[0][0]] for name, found in sorted(self.classes.items())]
+            self.listing = listing
+
+        return listing
+
+    def find(self, className):
+        '''
+        Find the file for a class.
+
+        Like Magento's autoloader, local overrides community and community
+        overrides core. A Mage_ class that isn't found is also looked for
+        under every vendor in local and community, for factory names that
+        were guessed from a module alias.
+        '''
+        found = self.classes.get(className)
+        if not found and className.startswith('Mage_'):
+            for name in self.vendorless.get(className[5:], []):
+                found = self.classes.get(name)
+                break
+
+        if found:
+            return os.path.join(self.root, found[0][0])
+
+        return None
+
+
+'''
+Factory types and the config.xml sections that declare their aliases.
+'''
+FACTORY_GROUPS = (
+    ('model', 'models', 'Model'),
+    ('helper', 'helpers', 'Helper'),
+    ('block', 'blocks', 'Block'),
+)
+
+FACTORY_ALIASES_VERSION = 1
+
+'''
+Factory methods and the type of class they create.
+'''
+FACTORY_METHODS = {
+    'getModel': 'model',
+    'getSingleton': 'model',
+    'getResourceModel': 'resource',
+    'getResourceSingleton': 'resource',
+    'helper': 'helper',
+    'getBlockSingleton': 'block',
+}
+
+FACTORY_CALL = re.compile('^Mage::(' + '|'.join(FACTORY_METHODS.keys()) + ')\\([\'"](.*)[\'"]\\)$')
+
+CODE_POOL_ORDER = ('core', 'community', 'local')
+
+factory_aliases = {}
+
+
+class FactoryAliases(BackgroundIndex):
+    '''
+    Table of the class aliases used by Magento's factory methods.
+
+    Built from the <models>, <helpers> and <blocks> sections of every
+    module's config.xml, including <rewrite> declarations, so that names like
+    'catalog/product' resolve to the exact class Magento would create. The
+    table is saved in the cache folder and config.xml files are read again
+    when their modification times change.
+    '''
+
+    def __init__(self, root, cachefile):
+        BackgroundIndex.__init__(self)
+        self.root = root
+        self.cachefile = cachefile
+        self.files = {}
+        self.classes = {}
+        self.resources = {}
+        self.rewrites = {}
+        self.ready = False
+        self.lock = threading.Lock()
+
+    def load(self):
+        try:
+            data = json.loads(codecs.open(self.cachefile, encoding='utf-8', mode='r').read())
+        except (IOError, ValueError):
+            return
+
+        if data.get('version') != FACTORY_ALIASES_VERSION:
+            return
+
+        self.lock.acquire()
+        try:
+            self.files = data['files']
+            self.rebuild()
+            self.ready = True
+        finally:
+            self.lock.release()
+
+    def save(self):
+        self.lock.acquire()
+        try:
+            data = json.dumps({'version': FACTORY_ALIASES_VERSION, 'files': self.files})
+        finally:
+            self.lock.release()
+
+        try:
+            codecs.open(self.cachefile, encoding='utf-8', mode='w').write(data)
+        except IOError:
+            pass
+
+    def parse(self, path):
+        '''
+        Read the factory declarations from a config.xml file.
+        '''
+        declarations = {'classes': {}, 'resources': {}, 'rewrites': {}}
+        try:
+            config = ElementTree.parse(os.path.join(self.root, path)).getroot()
+        except (IOError, SyntaxError, ExpatError):
+            return declarations
+
+        for kind, section, suffix in FACTORY_GROUPS:
+            for group in config.findall('global/' + section + '/*'):
+                node = group.find('class')
+                if node != None and node.text:
+                    declarations['classes'][kind + ':' + group.tag] = node.text.strip()
+                node = group.find('resourceModel')
+                if kind == 'model' and node != None and node.text:
+                    declarations['resources'][group.tag] = node.text.strip()
+                for rewrite in group.findall('rewrite/*'):
+                    if rewrite.text:
+                        declarations['rewrites'][kind + ':' + group.tag + '/' + rewrite.tag] = rewrite.text.strip()
+
+        return declarations
+
+    def rebuild(self):
+        '''
+        Merge the declarations of all modules. Like Magento, modules in local
+        take precedence over community, and community over core.
+        '''
+        def order(path):
+            pool = path.split(os.sep)[2]
+            if pool in CODE_POOL_ORDER:
+                return CODE_POOL_ORDER.index(pool), path
+            return -1, path
+
+        classes = {}
+        resources = {}
+        rewrites = {}
+        for path in sorted(self.files.keys(), key=order):
+            declarations = self.files[path][1]
+            classes.update(declarations['classes'])
+            resources.update(declarations['resources'])
+            rewrites.update(declarations['rewrites'])
+
+        self.classes = classes
+        self.resources = resources
+        self.rewrites = rewrites
+
+    def walk(self):
+        found = {}
+        for path in glob.glob(os.path.join(self.root, 'app', 'code', '*', '*', '*', 'etc', 'config.xml')):
+            try:
+                found[os.path.relpath(path, self.root)] = os.path.getmtime(path)
+            except OSError:
+                pass
+
+        return found
+
+    def refresh(self):
+        '''
+        Read any config.xml files that are new or have changed.
+        '''
+        changed = False
+        files = {}
+        for path, mtime in self.walk().items():
+            known = self.files.get(path)
+            if known and known[0] == mtime:
+                files[path] = known
+            else:
+                files[path] = [mtime, self.parse(path)]
+                changed = True
+
+        if len(files) != len(self.files):
+            changed = True
+
+        self.lock.acquire()
+        try:
+            self.files = files
+            if changed:
+                self.rebuild()
+            self.ready = True
+        finally:
+            self.lock.release()
+
+        if changed:
+            self.save()
+
+    def update_file(self, path):
+        path = os.path.relpath(path, self.root)
+        parts = path.split(os.sep)
+        if len(parts) != 7 or parts[:2] != ['app', 'code'] or parts[5:] != ['etc', 'config.xml']:
+            return
+
+        try:
+            mtime = os.path.getmtime(os.path.join(self.root, path))
+        except OSError:
+            return
+
+        entry = [mtime, self.parse(path)]
+        self.lock.acquire()
+        try:
+            self.files[path] = entry
+            self.rebuild()
+        finally:
+            self.lock.release()
+        self.save()
+
+    def resolve(self, kind, alias):
+        '''
+        Get the class name for a factory alias like 'catalog/product'.
+
+        kind is 'model', 'resource', 'helper' or 'block'. Falls back to
+        Magento's naming convention for groups that aren't declared.
+        '''
+        alias = alias.strip()
+        if kind == 'resource':
+            if '/' not in alias:
+                return None
+            group, name = alias.split('/', 1)
+            if group not in self.resources:
+                return None
+            kind = 'model'
+            alias = self.resources[group] + '/' + name
+
+        if '/' not in alias:
+            if kind != 'helper':
+                return alias
+            alias += '/data'
+
+        group, name = alias.split('/', 1)
+        rewrite = self.rewrites.get(kind + ':' + alias)
+        if rewrite:
+            return rewrite
+
+        prefix = self.classes.get(kind + ':' + group)
+        if prefix == None:
+            for k, section, suffix in FACTORY_GROUPS:
+                if k == kind:
+                    prefix = 'Mage_{group}_{suffix}'.format(group=cap_first_letter(group), suffix=suffix)
+
+        words = []
+        for word in name.split('_'):
+            words.append(cap_first_letter(word))
+
+        return prefix + '_' + '_'.join(words)
+
+
+ATTRIBUTE_MAP_VERSION = 1
+
+'''
+Patterns for the tables, columns and EAV attributes that module setup
+scripts and schema dumps declare.
+'''
+TABLE_REFERENCE = re.compile(r'''getTable\(\s*['"]([\w/]+)['"]\s*\)''')
+TABLE_VARIABLE = re.compile(r'''(\$\w+)\s*=\s*\$\w+->getTable\(\s*['"]([\w/]+)['"]\s*\)''')
+ADD_COLUMN = re.compile(r'''addColumn\(\s*(?:(\$\w+)(?:->getTable\(\s*['"]([\w/]+)['"]\s*\))?\s*,\s*)?['"](\w+)['"]''')
+SQL_TYPES = ('(?:tinyint|smallint|mediumint|bigint|int|integer|decimal|numeric|float|double|varchar|char|tinytext|'
+    'text|mediumtext|longtext|blob|mediumblob|longblob|varbinary|date|datetime|timestamp|time|year|enum|set|boolean)')
+SQL_COLUMN = re.compile(r'(?:^|[(,]|\bADD\s+(?:COLUMN\s+)?)\s*`?(\w+)`?\s+' + SQL_TYPES + r'\b',
+    re.IGNORECASE | re.MULTILINE)
+ADD_ATTRIBUTE = re.compile(r'''addAttribute\(\s*(?:['"](\w+)['"]|\\?(\w+)::ENTITY|\$\w+)\s*,\s*['"](\w+)['"]''')
+ENTITY_TYPE = re.compile(r'''['"](\w+)['"]\s*=>\s*array\(\s*['"]entity_model['"]\s*=>\s*['"]([\w/]+)['"]''')
+DEFAULT_ATTRIBUTE = re.compile(r'''['"](\w+)['"]\s*=>\s*array\(\s*['"](?:type|backend|frontend|label|input|''' +
+    r'''source|global|required|group|sort_order|default)['"]''')
+CREATE_TABLE = re.compile(r'CREATE TABLE (?:IF NOT EXISTS )?`?(\w+)`?\s*\((.*?)\n\)[^;]*;', re.IGNORECASE | re.DOTALL)
+INSERT_ROWS = re.compile(r'INSERT INTO `?(eav_entity_type|eav_attribute)`?\s*(?:\(([^)]*)\))?\s*VALUES\s*(.*?);\s*$',
+    re.IGNORECASE | re.DOTALL | re.MULTILINE)
+SQL_ROW = re.compile(r"\(((?:'(?:[^'\\]|\\.)*'|[^()'])*)\)")
+SQL_VALUE = re.compile(r"'((?:[^'\\]|\\.)*)'|([^,\s]+)")
+ATTRIBUTE_CODE = re.compile(r'^[A-Za-z_]\w*$')
+MODEL_INIT = re.compile(r'''->_init\(\s*['"]([\w/]+)['"]''')
+
+'''
+Entity type codes of the Magento core, for addAttribute() calls in modules
+whose setup doesn't declare the types it uses.
+'''
+ENTITY_TYPE_MODELS = {
+    'customer': 'customer/customer',
+    'customer_address': 'customer/address',
+    'catalog_category': 'catalog/category',
+    'catalog_product': 'catalog/product',
+    'order': 'sales/order',
+    'invoice': 'sales/order_invoice',
+    'creditmemo': 'sales/order_creditmemo',
+    'shipment': 'sales/order_shipment',
+}
+
+attribute_maps = {}
+
+'''
+The entity each model file initializes with _init(), keyed by path and
+checked against the file's modification time and size.
+'''
+class_entities = {}
+
+
+def sql_rows(values, columns, defaults):
+    '''
+    Read the rows of an INSERT statement's VALUES as dicts of the named
+    columns. defaults gives the column positions to use if the statement
+    doesn't list its columns.
+    '''
+    positions = dict(defaults)
+    if columns:
+        names = [c.strip().strip('`') for c in columns.split(',')]
+        for name in positions.keys():
+            positions[name] = None
+            if name in names:
+                positions[name] = names.index(name)
+
+    rows = []
+    for row in SQL_ROW.findall(values):
+        fields = [quoted or plain for quoted, plain in SQL_VALUE.findall(row)]
+        found = {}
+        for name, i in positions.items():
+            if i != None and i < len(fields):
+                found[name] = fields[i]
+        rows.append(found)
+
+    return rows
+
+
+class AttributeMap(BackgroundIndex):
+    '''
+    Attribute names of the entities in a Magento installation, for the
+    magic getters and setters of Varien_Object models.
+
+    It's imported on request, without a database connection, from the
+    tables and columns created by module setup scripts under sql/ and data/,
+    the EAV attributes they add, and optionally a schema dump (the
+    "schema_dump" setting) that can have the eav_attribute table's rows.
+    Entities are keyed by their resource alias, like 'sales/order', which is
+    what models pass to _init(). Attributes added with Class::ENTITY are
+    keyed by 'class:' and the class name.
+    '''
+
+    def __init__(self, root, cachefile, aliases):
+        BackgroundIndex.__init__(self)
+        self.root = root
+        self.cachefile = cachefile
+        self.aliases = aliases
+        self.schema = get_setting('schema_dump')
+        self.entities = {}
+        self.updated = 0
+
+    def load(self):
+        try:
+            data = json.loads(codecs.open(self.cachefile, encoding='utf-8', mode='r').read())
+        except (IOError, ValueError):
+            return
+
+        if data.get('version') != ATTRIBUTE_MAP_VERSION:
+            return
+
+        self.entities = data['entities']
+        self.updated = data['updated']
+
+    def save(self):
+        data = json.dumps({'version': ATTRIBUTE_MAP_VERSION, 'updated': self.updated, 'entities': self.entities})
+        try:
+            codecs.open(self.cachefile, encoding='utf-8', mode='w').write(data)
+        except IOError:
+            pass
+
+    def walk(self):
+        '''
+        List the setup scripts of every module: the PHP files under sql/ and
+        data/, and Setup.php files that declare default entities.
+        '''
+        found = []
+        for module in glob.glob(os.path.join(self.root, 'app', 'code', '*', '*', '*')):
+            for folder, subfolders, files in os.walk(module):
+                subfolders[:] = [f for f in subfolders if not f.startswith('.')]
+                parts = os.path.relpath(folder, module).split(os.sep)
+                for f in files:
+                    if f.endswith('.php') and (parts[0] in ('sql', 'data') or f == 'Setup.php'):
+                        found.append(os.path.join(folder, f))
+
+        return sorted(found)
+
+    def refresh(self):
+        '''
+        Import the attribute map from the setup scripts and the schema dump.
+        '''
+        entities = {}
+        types = dict(ENTITY_TYPE_MODELS)
+        added = []
+
+        def add(key, attribute):
+            if ATTRIBUTE_CODE.match(attribute):
+                entities.setdefault(key, set()).add(attribute)
+
+        for path in self.walk():
+            try:
+                source = codecs.open(path, encoding='utf-8', mode='r', errors='replace').read()
+            except IOError:
+                continue
+            self.read_script(source, add, types, added)
+
+        if self.schema:
+            self.read_schema(self.schema, add, types, added)
+
+        for typeCode, className, attribute in added:
+            if className:
+                add('class:' + className, attribute)
+            elif typeCode in types:
+                add(types[typeCode], attribute)
+
+        found = {}
+        for key, attributes in entities.items():
+            found[key] = sorted(attributes)
+
+        self.entities = found
+        self.updated = time.time()
+        self.save()
+
+        for cached in merged_symbol_cache.values():
+            cached['checked'] = 0
+
+    def read_script(self, source, add, types, added):
+        '''
+        Read the tables, columns and attributes a setup script declares.
+        '''
+        variables = dict(TABLE_VARIABLE.findall(source))
+        for statement in source.split(';'):
+            tables = TABLE_REFERENCE.findall(statement)
+            for variable, alias, column in ADD_COLUMN.findall(statement):
+                alias = alias or variables.get(variable) or (tables and tables[0])
+                if alias:
+                    add(alias, column)
+            if tables and re.search(r'\b(?:CREATE|ALTER)\s+TABLE\b', statement, re.IGNORECASE):
+                for column in SQL_COLUMN.findall(statement):
+                    add(tables[0], column)
+
+        for typeCode, className, attribute in ADD_ATTRIBUTE.findall(source):
+            added.append((typeCode, className, attribute))
+
+        matches = list(ENTITY_TYPE.finditer(source))
+        for i, match in enumerate(matches):
+            typeCode, alias = match.groups()
+            types[typeCode] = alias
+            end = len(source)
+            if i + 1 < len(matches):
+                end = matches[i + 1].start()
+            for attribute in DEFAULT_ATTRIBUTE.findall(source, match.end(), end):
+                add(alias, attribute)
+
+    def read_schema(self, path, add, types, added):
+        '''
+        Read the tables and EAV attributes in a schema dump. Tables are
+        matched to entities by the <entities> sections of config.xml.
+        '''
+        try:
+            dump = codecs.open(path, encoding='utf-8', mode='r', errors='replace').read()
+        except IOError:
+            return
+
+        tables = self.read_entity_tables()
+        for table, body in CREATE_TABLE.findall(dump):
+            if table in tables:
+                for column in SQL_COLUMN.findall(body):
+                    add(tables[table], column)
+
+        typeCodes = {}
+        attributes = []
+        for table, columns, values in INSERT_ROWS.findall(dump):
+            if table.lower() == 'eav_entity_type':
+                for row in sql_rows(values, columns, {'entity_type_id': 0, 'entity_type_code': 1, 'entity_model': 2}):
+                    typeCodes[row.get('entity_type_id')] = row.get('entity_type_code')
+                    if row.get('entity_model'):
+                        types[row.get('entity_type_code')] = row.get('entity_model')
+            else:
+                attributes.extend(sql_rows(values, columns, {'entity_type_id': 1, 'attribute_code': 2}))
+
+        for row in attributes:
+            typeCode = typeCodes.get(row.get('entity_type_id'))
+            if typeCode and row.get('attribute_code'):
+                added.append((typeCode, '', row.get('attribute_code')))
+
+    def read_entity_tables(self):
+        '''
+        Map table names to entity aliases from the <entities> of the
+        resource models declared in config.xml.
+        '''
+        groups = {}
+        for group, resource in self.aliases.resources.items():
+            groups[resource] = group
+
+        tables = {}
+        for path in self.aliases.files.keys():
+            try:
+                config = ElementTree.parse(os.path.join(self.root, path)).getroot()
+            except (IOError, SyntaxError, ExpatError):
+                continue
+            for resource in config.findall('global/models/*'):
+                if resource.tag not in groups:
+                    continue
+                for entity in resource.findall('entities/*'):
+                    node = entity.find('table')
+                    if node != None and node.text:
+                        tables[node.text.strip()] = groups[resource.tag] + '/' + entity.tag
+
+        return tables
+
+    def find(self, keys):
+        '''
+        Get the attributes of all of keys.
+        '''
+        found = set()
+        for key in keys:
+            found.update(self.entities.get(key, []))
+
+        return sorted(found)
+
+
+def magic_symbols(attributes, className):
+    '''
+    Make the magic getX() and setX() methods Varien_Object provides for a
+    model's attributes.
+    '''
+    symbols = {}
+    for attribute in attributes:
+        name = ''.join([cap_first_letter(word) for word in attribute.split('_') if word])
+        if not name:
+            continue
+        symbols[intern_string('get' + name)] = Symbol('function', (), '', 'public', False, className)
+        symbols[intern_string('set' + name)] = Symbol('function', ('$value',), '$this', 'public', False, className)
+
+    return symbols
+
+
+'''
+How long, in seconds, a cached symbol table is trusted before the file's
+modification time and size are checked again.
+'''
+SYMBOL_CACHE_RECHECK = 2
+
+'''
+Estimated memory, in bytes, of a symbol in a file's table and of an entry in
+a merged table, which shares its symbols with the files' tables.
+'''
+SYMBOL_SIZE = 120
+MERGED_SYMBOL_SIZE = 80
+
+MEMBER_MODIFIERS = ('T_PUBLIC', 'T_PROTECTED', 'T_PRIVATE', 'T_STATIC', 'T_ABSTRACT', 'T_FINAL', 'T_VAR')
+
+'''
+Strings shared by symbol tables, so each method, argument and class name is
+held in memory once however many tables it appears in.
+'''
+symbol_strings = {}
+
+
+def intern_string(text):
+    return symbol_strings.setdefault(text, text)
+
+
+class Symbol(object):
+    '''
+    A function, property or constant in a class's symbol table.
+
+    Symbols for a whole installation can be held at once, so they have slots
+    instead of a dict and their strings are interned. className is the class
+    that declares the member.
+    '''
+
+    __slots__ = ('kind', 'args', 'returnType', 'visibility', 'static', 'className')
+
+    def __init__(self, kind, args, returnType, visibility, static, className):
+        self.kind = kind
+        self.args = args
+        self.returnType = returnType
+        self.visibility = visibility
+        self.static = static
+        self.className = className
+
+    def pack(self):
+        '''
+        Get the symbol as a list, for saving or sending to another process.
+        '''
+        return [self.kind, self.args, self.returnType, self.visibility, self.static, self.className]
+
+
+def pack_symbols(symbols):
+    packed = {}
+    for name, symbol in symbols.items():
+        packed[name] = symbol.pack()
+
+    return packed
+
+
+def unpack_symbols(packed):
+    '''
+    Rebuild a symbol table saved by pack_symbols(), interning its strings.
+    '''
+    symbols = {}
+    for name, (kind, args, returnType, visibility, static, className) in packed.items():
+        symbols[intern_string(name)] = Symbol(intern_string(kind), tuple([intern_string(a) for a in args]),
+            intern_string(returnType), intern_string(visibility), static, intern_string(className))
+
+    return symbols
+
+
+def filter_symbols(symbols, context):
+    '''
+    Get the symbols from a file's symbol table that can be used in a context.
+
+    'private' is for $this: every function and all instance properties.
+    'static' is for Class:: and self::, the public static functions and
+    properties and the constants. 'public' is for any other object: its
+    public functions and instance properties.
+    '''
+    filtered = {}
+    for name, symbol in symbols.items():
+        if context == 'private':
+            usable = symbol.kind == 'function' or (symbol.kind == 'variable' and not symbol.static)
+        elif context == 'static':
+            usable = symbol.static and (symbol.kind == 'constant' or symbol.visibility == 'public')
+        else:
+            usable = symbol.kind != 'constant' and not symbol.static and symbol.visibility == 'public'
+        if usable:
+            filtered[name] = symbol
+
+    return filtered
+
+'''
+Patterns for the classes a file refers to, used to warm the symbol cache
+when it's opened or saved.
+'''
+PHP_FILE = re.compile(r'\.(php|phtml)$', re.IGNORECASE)
+CLASS_HINT = re.compile(r'@(?:var|param|return)\s+(?:\$\w+\s+)?([A-Za-z_]\w*_\w+)')
+FACTORY_REFERENCE = re.compile('Mage::(' + '|'.join(FACTORY_METHODS.keys()) + ')\\(\\s*[\'"]([\\w/]+)[\'"]')
+CLASS_REFERENCE = re.compile(r'\b(?:new|extends|instanceof)\s+([A-Za-z_]\w*)')
+STATIC_REFERENCE = re.compile(r'\b([A-Z]\w*_\w+)::')
+PRECOMPUTE_LIMIT = 100
+
+
+class LRUCache(object):
+    '''
+    A least recently used cache with a limit on the total size of its entries.
+
+    Sizes are whatever unit the caller uses, usually an estimate in bytes.
+    '''
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.entries = {}
+        self.size = 0
+        self.tick = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        self.lock.acquire()
+        try:
+            entry = self.entries.get(key)
+            if entry == None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self.tick += 1
+            entry[0] = self.tick
+            return entry[2]
+        finally:
+            self.lock.release()
+
+    def put(self, key, value, size):
+        self.lock.acquire()
+        try:
+            if key in self.entries:
+                self.size -= self.entries[key][1]
+            self.tick += 1
+            self.entries[key] = [self.tick, size, value]
+            self.size += size
+            if self.size > self.limit:
+                self.evict()
+        finally:
+            self.lock.release()
+
+    def evict(self):
+        '''
+        Drop the least recently used entries until the cache is down to three
+        quarters of its limit, so eviction doesn't happen on every put.
+        '''
+        entries = sorted(self.entries.items(), key=lambda item: item[1][0])
+        for key, entry in entries:
+            if self.size <= self.limit * 3 / 4:
+                break
+            del self.entries[key]
+            self.size -= entry[1]
+
+    def remove(self, key):
+        self.lock.acquire()
+        try:
+            if key in self.entries:
+                self.size -= self.entries[key][1]
+                del self.entries[key]
+        finally:
+            self.lock.release()
+
+    def remove_where(self, predicate):
+        '''
+        Remove the entries for which predicate(key, value) is true.
+        '''
+        self.lock.acquire()
+        try:
+            for key, entry in self.entries.items():
+                if predicate(key, entry[2]):
+                    del self.entries[key]
+                    self.size -= entry[1]
+        finally:
+            self.lock.release()
+
+    def values(self):
+        self.lock.acquire()
+        try:
+            return [entry[2] for entry in self.entries.values()]
+        finally:
+            self.lock.release()
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.entries = {}
+            self.size = 0
+        finally:
+            self.lock.release()
+
+
+symbol_cache = LRUCache(32 * 1024 * 1024)
+
+'''
+Class hierarchy graph: the parent class declared in each file, keyed by path
+and checked against the file's modification time and size.
+'''
+class_parents = {}
+
+'''
+Symbol tables merged up the inheritance chain, keyed by class and context.
+'''
+merged_symbol_cache = LRUCache(32 * 1024 * 1024)
+
+
+def forget_files(paths, classNames):
+    '''
+    Forget what's cached about files that changed and the classes they
+    declare or declared: the files' symbol tables, parents and entities, and
+    the merged symbol tables of classes whose inheritance chain includes
+    one of the files or classes.
+    '''
+    for path in paths:
+        symbol_cache.remove(path)
+        class_parents.pop(path, None)
+        class_entities.pop(path, None)
+
+    paths = set(paths)
+    classNames = set(classNames)
+
+    def affected(key, cached):
+        if key[0] in classNames or classNames.intersection(cached['classes']):
+            return True
+        for stamp in cached['stamps']:
+            if stamp[0] in paths:
+                return True
+        return False
+
+    merged_symbol_cache.remove_where(affected)
+
+
+'''
+How often, in seconds, to check for a git checkout.
+'''
+CHECKOUT_RECHECK = 2
+
+checkouts = {}
+
+
+def find_git_folder(folder):
+    '''
+    Find the git folder of the repository a folder is in, following the
+    .git file of a worktree or submodule.
+    '''
+    while True:
+        path = os.path.join(folder, '.git')
+        if os.path.isdir(path):
+            return path
+        if os.path.isfile(path):
+            try:
+                line = open(path).read().strip()
+            except IOError:
+                return None
+            if line.startswith('gitdir:'):
+                return os.path.normpath(os.path.join(folder, line[7:].strip()))
+            return None
+
+        parent = os.path.dirname(folder)
+        if parent == folder:
+            return None
+        folder = parent
+
+
+class GitCheckout(object):
+    '''
+    Notices when the files of a git working tree may have changed in bulk,
+    by a branch switch, reset, merge or pull, from .git/HEAD and the
+    modification time and size of the git index.
+    '''
+
+    def __init__(self, root):
+        self.gitFolder = find_git_folder(root)
+        self.checked = time.time()
+        self.stamp = self.read_stamp()
+
+    def read_stamp(self):
+        if self.gitFolder == None:
+            return None
+
+        try:
+            head = open(os.path.join(self.gitFolder, 'HEAD')).read().strip()
+            index = os.stat(os.path.join(self.gitFolder, 'index'))
+        except (IOError, OSError):
+            return None
+
+        return (head, index.st_mtime, index.st_size)
+
+    def changed(self):
+        '''
+        Check if the working tree changed since the last check. Checks at
+        most every CHECKOUT_RECHECK seconds.
+        '''
+        if self.gitFolder == None or time.time() - self.checked < CHECKOUT_RECHECK:
+            return False
+
+        self.checked = time.time()
+        stamp = self.read_stamp()
+        if stamp == self.stamp:
+            return False
+
+        self.stamp = stamp
+        return True
+
+'''
+Member names used with -> or ::, for ranking completions. Usage is counted
+in the files that are opened or scanned, per file, so a file that's scanned
+again replaces its old counts.
+'''
+MEMBER_USAGE = re.compile(r'(?:->|::)\s*\$?(\w+)')
+member_usage = {}
+usage_sources = {}
+usage_lock = threading.Lock()
+
+WORD_BEFORE = re.compile(r'\$?\w*$')
+
+
+def record_usage(source, code):
+    '''
+    Count the members used in code, replacing the counts from source's
+    previous version.
+    '''
+    counts = {}
+    for name in MEMBER_USAGE.findall(code):
+        name = name.lower()
+        counts[name] = counts.get(name, 0) + 1
+
+    usage_lock.acquire()
+    try:
+        for name, n in usage_sources.get(source, {}).items():
+            member_usage[name] -= n
+        for name, n in counts.items():
+            member_usage[name] = member_usage.get(name, 0) + n
+        usage_sources[source] = counts
+    finally:
+        usage_lock.release()
+
+
+def make_snippet(name, symbol):
+    '''
+    Build the completion for a symbol: a function call with a tab stop for
+    each argument, or the name of a property or constant.
+    '''
+    if symbol.kind != 'function':
+        return name
+
+    args = []
+    for i, a in enumerate(symbol.args):
+        args.append('${' + str(i + 1) + ':' + a.replace('$', '\\$') + '}')
+
+    return '{name}({args})'.format(name=name, args=', '.join(args))
+
+
+class CompletionIndex(object):
+    '''
+    The completions for a class's symbols, sorted by name with their
+    snippets built once, so completing a prefix is a binary search and takes
+    time in proportion to the number of matches.
+    '''
+
+    def __init__(self, symbols):
+        entries = []
+        for name, symbol in symbols.items():
+            entries.append((name.lstrip('$').lower(), name, name + '\t' + symbol.className,
+                make_snippet(name, symbol)))
+        entries.sort()
+
+        self.symbols = symbols
+        self.keys = [entry[0] for entry in entries]
+        self.entries = entries
+
+    def find(self, prefix=''):
+        '''
+        Get the completions that start with prefix, ignoring case.
+
+        Names that match prefix's case come first, then the most used ones.
+        '''
+        prefix = prefix.lstrip('$')
+        lowered = prefix.lower()
+        found = []
+        i = bisect.bisect_left(self.keys, lowered)
+        while i < len(self.keys) and self.keys[i].startswith(lowered):
+            found.append(self.entries[i])
+            i += 1
+
+        found.sort(key=lambda entry: (not entry[1].lstrip('$').startswith(prefix),
+            -member_usage.get(entry[0], 0), entry[0]))
+
+        return [(label, snippet) for key, name, label, snippet in found]
+
+
+'''
+Code pools covered by the symbol index, and how many newly indexed files
+are collected before the index is saved, so an interrupted run resumes
+close to where it stopped.
+'''
+SYMBOL_INDEX_POOLS = ('core', 'community', 'local', 'lib')
+SYMBOL_INDEX_VERSION = 2
+SYMBOL_INDEX_SAVE_EVERY = 500
+INDEX_THREADS = TOKENIZER_WORKERS
+
+symbol_indexes = {}
+
+'''
+Engine used by index workers, one per process.
+'''
+index_engine = None
+
+
+def start_index_process():
+    '''
+    Set up an index worker process. PHP workers inherited from the parent
+    process are left alone and the process starts its own.
+    '''
+    tokenizers['php'] = PhpTokenizer()
+
+
+def index_php_file(task):
+    '''
+    Read the parent class and the symbols of a file for the symbol index.
+
+    Runs in index worker threads or processes. task is (root, path,
+    folders, settings) and the result is (path, [mtime, size, parent,
+    symbols]) with the symbols packed by pack_symbols(), or (path, None) if
+    the file can't be read.
+    '''
+    global index_engine
+    root, path, folders, settings = task
+    if index_engine == None:
+        index_engine = CompletionEngine()
+
+    job_context.folders = folders
+    job_context.settings = settings
+    try:
+        full = os.path.join(root, path)
+        try:
+            stat = os.stat(full)
+            source = codecs.open(full, encoding='utf-8', mode='r', errors='replace').read()
+        except (IOError, OSError):
+            return path, None
+
+        tokens = index_engine.get_all_tokens(source, cache=False)
+        return path, [stat.st_mtime, stat.st_size, index_engine.get_parent_class(tokens),
+            pack_symbols(index_engine.extract_symbols(tokens))]
+    finally:
+        job_context.folders = None
+        job_context.settings = None
+
+
+def thread_map(function, tasks, size=INDEX_THREADS):
+    '''
+    Call function on each task in a pool of threads, yielding the results in
+    the order they finish, like multiprocessing's imap_unordered.
+    '''
+    waiting = Queue.Queue()
+    for task in tasks:
+        waiting.put(task)
+    results = Queue.Queue()
+    stopped = []
+
+    def work():
+        while not stopped:
+            try:
+                task = waiting.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                results.put(function(task))
+            except Exception:
+                results.put(None)
+
+    for i in range(0, size):
+        thread = threading.Thread(target=work)
+        thread.daemon = True
+        thread.start()
+
+    try:
+        for i in range(0, len(tasks)):
+            result = results.get()
+            if result != None:
+                yield result
+    finally:
+        stopped.append(True)
+
+
+class SymbolIndex(BackgroundIndex):
+    '''
+    Index of the parent class and the symbols, with their return types, of
+    every PHP file in the core, community and local code pools and lib.
+
+    Building it reads thousands of files, so it's only done on request and
+    in parallel: by threads sharing the PHP tokenizer workers in the editor,
+    or by a pool of processes from the command line. The index is saved in
+    the cache folder as it's built and files that are already indexed and
+    unchanged are skipped, so an interrupted build resumes where it left
+    off. scan_file and get_parent_of use indexed files instead of parsing
+    them.
+    '''
+
+    def __init__(self, root, cachefile):
+        BackgroundIndex.__init__(self)
+        self.root = root
+        self.cachefile = cachefile
+        self.files = {}
+        self.progress = (0, 0)
+        self.loaded = False
+        self.ready = False
+        self.lock = threading.Lock()
+
+        # Index workers can't ask the editor for folders and settings
+        self.folders = list(window_folders())
+        self.settings = {'tokenizer': get_setting('tokenizer')}
+
+    def load(self):
+        '''
+        Load the index saved by a previous (possibly unfinished) build.
+        '''
+        self.loaded = True
+        try:
+            data = json.loads(codecs.open(self.cachefile, encoding='utf-8', mode='r').read())
+        except (IOError, ValueError):
+            return
+
+        if data.get('version') != SYMBOL_INDEX_VERSION or data.get('tokenizer') != self.settings['tokenizer']:
+            return
+
+        files = {}
+        for path, (mtime, size, parent, symbols) in data['files'].items():
+            files[path] = [mtime, size, parent and intern_string(parent), unpack_symbols(symbols)]
+
+        self.lock.acquire()
+        try:
+            self.files = files
+            self.ready = data.get('complete', False)
+        finally:
+            self.lock.release()
+
+    def save(self, complete=False):
+        self.lock.acquire()
+        try:
+            files = {}
+            for path, (mtime, size, parent, symbols) in self.files.items():
+                files[path] = [mtime, size, parent, pack_symbols(symbols)]
+            data = json.dumps({'version': SYMBOL_INDEX_VERSION, 'tokenizer': self.settings['tokenizer'],
+                'complete': complete, 'files': files})
+        finally:
+            self.lock.release()
+
+        try:
+            codecs.open(self.cachefile, encoding='utf-8', mode='w').write(data)
+        except IOError:
+            pass
+
+    def walk(self):
+        '''
+        List the PHP files in the indexed code pools with their modification
+        times and sizes.
+        '''
+        found = {}
+        for pool, folders in CODE_POOLS:
+            if pool not in SYMBOL_INDEX_POOLS:
+                continue
+            for folder, subfolders, files in os.walk(os.path.join(self.root, *folders)):
+                subfolders[:] = [f for f in subfolders if not f.startswith('.')]
+                for f in files:
+                    if not f.endswith('.php'):
+                        continue
+                    path = os.path.join(folder, f)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    found[os.path.relpath(path, self.root)] = (stat.st_mtime, stat.st_size)
+
+        return found
+
+    def refresh(self, mapper=thread_map, progress=None):
+        '''
+        Index the files that are new or changed since they were last
+        indexed.
+
+        mapper(function, tasks) runs the indexing in parallel, threads by
+        default. progress(done, total) is called as files are indexed.
+        '''
+        if not self.loaded:
+            self.load()
+
+        found = self.walk()
+        tasks = []
+        self.lock.acquire()
+        try:
+            for path in self.files.keys():
+                if path not in found:
+                    del self.files[path]
+            for path in sorted(found.keys()):
+                known = self.files.get(path)
+                if not known or (known[0], known[1]) != found[path]:
+                    tasks.append((self.root, path, self.folders, self.settings))
+        finally:
+            self.lock.release()
+
+        self.progress = (0, len(tasks))
+        if progress:
+            progress(0, len(tasks))
+
+        done = 0
+        for path, entry in mapper(index_php_file, tasks):
+            self.lock.acquire()
+            try:
+                if entry:
+                    mtime, size, parent, symbols = entry
+                    self.files[path] = [mtime, size, parent and intern_string(parent), unpack_symbols(symbols)]
+                elif path in self.files:
+                    del self.files[path]
+            finally:
+                self.lock.release()
+
+            done += 1
+            self.progress = (done, len(tasks))
+            if progress:
+                progress(done, len(tasks))
+            if done % SYMBOL_INDEX_SAVE_EVERY == 0:
+                self.save()
+
+        self.save(complete=True)
+        self.ready = True
+
+    def find(self, path, stat):
+        '''
+        Get the index entry for a file, as [mtime, size, parent, symbols],
+        if it was indexed and hasn't changed since.
+        '''
+        entry = self.files.get(os.path.relpath(path, self.root))
+        if entry and entry[0] == stat.st_mtime and entry[1] == stat.st_size:
+            return entry
+
+        return None
+
+
+TOKEN_RECORD = struct.Struct('<4s32sI')
+
+TOKEN_RECORD_MAGIC = 'MITK'
+
+LEGACY_CACHE_FILE = re.compile('^[0-9a-f]{32}$')
+
+token_stores = {}
+
+
+def encode_tokens(tokens):
+    '''
+    Encode tokens as a table of unique strings and an array of integer pairs
+    holding each token's code (0 for bare strings) and its string's index.
+    Line numbers aren't stored since they can be worked out from the text.
+    '''
+    strings = []
+    ids = {}
+    pairs = array.array('i')
+    for t in tokens:
+        if type(t).__name__ == 'list':
+            code = int(t[0])
+            text = t[1]
+        else:
+            code = 0
+            text = t
+        i = ids.get(text)
+        if i == None:
+            i = len(strings)
+            ids[text] = i
+            strings.append(text)
+        pairs.append(code)
+        pairs.append(i)
+
+    table = json.dumps(strings)
+    return zlib.compress(struct.pack('<I', len(table)) + table + pairs.tostring())
+
+
+def decode_tokens(data):
+    data = zlib.decompress(data)
+    length = struct.unpack('<I', data[:4])[0]
+    strings = json.loads(data[4:4 + length])
+    pairs = array.array('i')
+    pairs.fromstring(data[4 + length:])
+
+    tokens = []
+    line = 1
+    for i in range(0, len(pairs), 2):
+        text = strings[pairs[i + 1]]
+        if pairs[i]:
+            tokens.append([pairs[i], text, line])
+        else:
+            tokens.append(text)
+        line += text.count('\n')
+
+    return tokens
+
+
+def remove_legacy_cache(folder):
+    '''
+    Delete the one-file-per-md5 token cache used by older versions.
+    '''
+    for f in os.listdir(folder):
+        if LEGACY_CACHE_FILE.match(f):
+            try:
+                os.remove(os.path.join(folder, f))
+            except OSError:
+                pass
+
+
+class TokenStore(object):
+    '''
+    Cache of tokenized code in a single append-only file.
+
+    Each record is a header holding the md5 key of the code and the length of
+    the encoded tokens, followed by the tokens. The index of records is kept
+    in memory and rebuilt from the headers when the store is opened. When the
+    file grows past its size limit the most recently used records are copied
+    to a new file and the rest are dropped.
+    '''
+
+    def __init__(self, path, limit):
+        self.path = path
+        self.limit = limit
+        self.index = {}
+        self.size = 0
+        self.tick = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.open()
+
+    def open(self):
+        '''
+        Rebuild the index from the records in the file.
+
+        A partly written record at the end of the file is cut off.
+        '''
+        self.index = {}
+        self.size = 0
+        try:
+            f = open(self.path, 'rb')
+        except IOError:
+            return
+
+        try:
+            total = os.fstat(f.fileno()).st_size
+            while True:
+                header = f.read(TOKEN_RECORD.size)
+                if len(header) < TOKEN_RECORD.size:
+                    break
+                magic, key, length = TOKEN_RECORD.unpack(header)
+                start = self.size + TOKEN_RECORD.size
+                if magic != TOKEN_RECORD_MAGIC or start + length > total:
+                    break
+                self.tick += 1
+                self.index[key] = [start, length, self.tick]
+                self.size = start + length
+                f.seek(self.size)
+        finally:
+            f.close()
+
+        if self.size < total:
+            f = open(self.path, 'r+b')
+            try:
+                f.truncate(self.size)
+            finally:
+                f.close()
+
+    def get(self, key):
+        self.lock.acquire()
+        try:
+            entry = self.index.get(key)
+            if entry == None:
+                self.misses += 1
+                return None
+
+            f = open(self.path, 'rb')
+            try:
+                f.seek(entry[0])
+                data = f.read(entry[1])
+            finally:
+                f.close()
+            self.hits += 1
+            self.tick += 1
+            entry[2] = self.tick
+        finally:
+            self.lock.release()
+
+        try:
+            return decode_tokens(data)
+        except (zlib.error, struct.error, ValueError):
+            return None
+
+    def put(self, key, tokens):
+        data = encode_tokens(tokens)
+        self.lock.acquire()
+        try:
+            f = open(self.path, 'ab')
+            try:
+                f.write(TOKEN_RECORD.pack(TOKEN_RECORD_MAGIC, key, len(data)))
+                f.write(data)
+            finally:
+                f.close()
+            self.tick += 1
+            self.index[key] = [self.size + TOKEN_RECORD.size, len(data), self.tick]
+            self.size += TOKEN_RECORD.size + len(data)
+            if self.size > self.limit:
+                self.compact()
+        finally:
+            self.lock.release()
+
+    def compact(self):
+        '''
+        Rewrite the file with the most recently used records, up to half of
+        the size limit.
+        '''
+        entries = sorted(self.index.items(), key=lambda item: item[1][2], reverse=True)
+        temp = self.path + '.tmp'
+        source = open(self.path, 'rb')
+        target = open(temp, 'wb')
+        index = {}
+        size = 0
+        try:
+            for key, (start, length, tick) in entries:
+                if size + TOKEN_RECORD.size + length > self.limit / 2:
+                    self.evictions += 1
+                    continue
+                source.seek(start)
+                target.write(TOKEN_RECORD.pack(TOKEN_RECORD_MAGIC, key, length))
+                target.write(source.read(length))
+                index[key] = [size + TOKEN_RECORD.size, length, tick]
+                size += TOKEN_RECORD.size + length
+        finally:
+            source.close()
+            target.close()
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(temp, self.path)
+        self.index = index
+        self.size = size
+
+    def stats(self):
+        return {'entries': len(self.index), 'size': self.size, 'hits': self.hits,
+            'misses': self.misses, 'evictions': self.evictions}
+
+
+class Document(object):
+    '''
+    The code being completed and the cursor position in it.
+
+    This is all the engine needs from an editor view. id identifies the
+    buffer so its tokens can be kept up to date between completions. prefix
+    is the part of the member name typed so far, by default the word before
+    the cursor.
+    '''
+
+    def __init__(self, id, code, point, fileName=None, prefix=None):
+        self.id = id
+        self.code = code
+        self.point = point
+        self.fileName = fileName
+        if prefix == None:
+            prefix = WORD_BEFORE.search(code[max(0, point - 100):point]).group(0)
+        self.prefix = prefix
+
+
+class Environment(object):
+    '''
+    The project folders and settings the engine works with.
+
+    The editor plugin installs one that reads the window's folders and the
+    settings file. The command line creates one from its arguments.
+    '''
+
+    def __init__(self, folders=None, settings=None):
+        self.folders = folders or []
+        self.settings = settings or {}
+
+    def get_folders(self):
+        return self.folders
+
+    def get_setting(self, name, default=None):
+        return self.settings.get(name, default)
+
+
+environment = Environment()
+
+
+def set_environment(env):
+    global environment
+    environment = env
+
+
+'''
+The project folders and settings captured for the job running on a worker
+thread, which can't read them from the editor itself.
+'''
+job_context = threading.local()
+
+
+'''
+Number of recent completions kept for the timing report.
+'''
+TRACE_SIZE = 50
+
+traces = collections.deque(maxlen=TRACE_SIZE)
+
+
+class Trace(object):
+    '''
+    Timings and counts for one completion.
+
+    phases maps a phase name to [calls, seconds]. Phases can nest, e.g.
+    scan_file includes the get_all_tokens calls it makes.
+    '''
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.time()
+        self.total = 0
+        self.phases = {}
+        self.counts = {}
+
+    def add(self, phase, seconds):
+        entry = self.phases.setdefault(phase, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+
+def trace_count(name, n=1):
+    '''
+    Count an event in the completion being traced on this thread, if any.
+    '''
+    trace = getattr(job_context, 'trace', None)
+    if trace != None:
+        trace.count(name, n)
+
+
+def trace_phase(phase, seconds):
+    '''
+    Add time spent in a phase to the completion being traced on this
+    thread, if any.
+    '''
+    trace = getattr(job_context, 'trace', None)
+    if trace != None:
+        trace.add(phase, seconds)
+
+
+def traced(phase):
+    '''
+    Decorator that records the time spent in a method as a phase.
+    '''
+    def decorate(method):
+        def run(*args, **kwargs):
+            if getattr(job_context, 'trace', None) == None:
+                return method(*args, **kwargs)
+
+            start = time.time()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                trace_phase(phase, time.time() - start)
+
+        run.__name__ = method.__name__
+        run.__doc__ = method.__doc__
+        return run
+
+    return decorate
+
+
+def format_traces(traces):
+    '''
+    Describe recent completions: the time spent in each phase and the
+    counts, summed over all of them, then a line for each completion.
+    '''
+    traces = list(traces)
+    if not traces:
+        return 'No completions have been traced yet. Set "trace_completions" to true to trace them.'
+
+    phases = {}
+    counts = {}
+    for trace in traces:
+        for phase, (calls, seconds) in trace.phases.items():
+            entry = phases.setdefault(phase, [0, 0.0])
+            entry[0] += calls
+            entry[1] += seconds
+        for name, n in trace.counts.items():
+            counts[name] = counts.get(name, 0) + n
+
+    total = sum([trace.total for trace in traces])
+    lines = ['{count} completions, {total:.1f} ms in total, {average:.1f} ms on average'.format(count=len(traces),
+        total=total * 1000, average=total * 1000 / len(traces)), '']
+    lines.append('{phase:<20} {calls:>8} {ms:>10} {share:>6}'.format(phase='Phase', calls='Calls', ms='ms', share='%'))
+    for phase, (calls, seconds) in sorted(phases.items(), key=lambda item: -item[1][1]):
+        lines.append('{phase:<20} {calls:>8} {ms:>10.1f} {share:>6.1f}'.format(phase=phase, calls=calls,
+            ms=seconds * 1000, share=seconds * 100 / max(total, 0.000001)))
+    lines.append('')
+    for name in sorted(counts.keys()):
+        lines.append('{name:<29} {count:>10}'.format(name=name, count=counts[name]))
+    lines.append('')
+    for trace in reversed(traces):
+        lines.append('{when} {total:8.1f} ms  {name}'.format(when=time.strftime('%H:%M:%S',
+            time.localtime(trace.started)), total=trace.total * 1000, name=trace.name))
+
+    return '\n'.join(lines)
+
+
+class CompletionEngine(object):
+    '''
+    Magento completion engine.
+    '''
+
+    def __init__(self):
+        self.buffers = {}
+        self.counters = {'lookups': 0, 'probes': 0}
+        self.tokenizer = None
+        self._constants = None
+
+    def is_cancelled(self):
+        '''
+        Check if the completion job running on this thread was superseded.
+        '''
+        cancelled = getattr(job_context, 'cancelled', None)
+        return cancelled != None and cancelled()
+
+    def warm_symbols(self, code, source=None):
+        '''
+        Load the symbols of the classes that code refers to through @var,
+        @param and @return hints, factory calls and class names, plus the
+        class it declares.
+
+        The members code uses are counted for ranking completions, as the
+        usage of source.
+        '''
+        if source:
+            record_usage(source, code)
+
+        classNames = []
+        for found in CLASS_DECLARATION.findall(code):
+            classNames.append((found, 'private'))
+        for found in CLASS_HINT.findall(code):
+            classNames.append((found, 'public'))
+        for method, alias in FACTORY_REFERENCE.findall(code):
+            found = self.get_factory_aliases().resolve(FACTORY_METHODS[method], alias)
+            if found:
+                classNames.append((found, 'public'))
+        for found in CLASS_REFERENCE.findall(code):
+            classNames.append((found, 'public'))
+        for found in STATIC_REFERENCE.findall(code):
+            classNames.append((found, 'static'))
+
+        seen = set()
+        for className, context in classNames:
+            if (className, context) in seen or len(seen) >= PRECOMPUTE_LIMIT:
+                continue
+            if self.is_cancelled():
+                return
+            seen.add((className, context))
+            self.get_symbols(className, context)
+
+    def get_cache_folder(self):
+        '''
+        Get the cache folder for the project, creating it if needed.
+        '''
+        folder = get_project().cacheFolder
+        if folder and not os.path.exists(folder):
+            os.mkdir(folder)
+
+        return folder
+
+    @traced('get_all_tokens')
+    def get_all_tokens(self, code=None, cache=True):
+        '''
+        Tokenize the code with the selected tokenizer.
+
+        With cache=True the tokens are kept in the token store, keyed by the
+        md5 of the code.
+        '''
+        code = code.encode('utf-8')
+
+        if get_tokenizer() != self.tokenizer:
+            self.get_all_token_names()
+
+        if cache:
+            m = hashlib.md5()
+            m.update(self.tokenizer.stamp() or self.tokenizer.name)
+            m.update(code)
+            key = m.hexdigest()
+            store = self.get_token_store()
+            tokens = store.get(key)
+            if tokens != None:
+                trace_count('token store hits')
+                return tokens
+            trace_count('token store misses')
+
+        # The code is streamed to a running PHP worker over stdin so there's no process startup
+        # cost and no limit on the size of the code.
+        tokens = self.tokenizer.tokenize(code)
+        if tokens == None:
+            return []
+
+        if cache:
+            store.put(key, tokens)
+
+        return tokens
+
+    def tokenize_fragment(self, code, inline=True):
+        '''
+        Tokenize a fragment of a buffer.
+
+        With inline=False the code is assumed to start inside a <?php block.
+        '''
+        if inline:
+            return self.get_all_tokens(code, cache=False)
+
+        return self.tokenizer.tokenize_fragment(code.encode('utf-8'))
+
+    def get_buffer(self, document, point):
+        '''
+        Get the code, tokens and type hints of a document's buffer, updated
+        to match its current code, and the tokens before point.
+
+        Completion jobs for the same view can overlap while a superseded one
+        winds down, so the buffer is only touched while holding its lock.
+        '''
+        if get_tokenizer() != self.tokenizer:
+            self.get_all_token_names()
+
+        buffer = self.buffers.get(document.id)
+        if buffer == None or buffer.tokenizer != self.tokenizer:
+            buffer = BufferTokens(self.tokenizer)
+            self.buffers[document.id] = buffer
+
+        buffer.lock.acquire()
+        try:
+            buffer.update(document.code, self.tokenize_fragment, self.token)
+            return (buffer.code, buffer.tokens, buffer.get_hints(self.token),
+                buffer.tokens_before(point, self.tokenize_fragment))
+        finally:
+            buffer.lock.release()
+
+    def get_all_token_names(self):
+        '''
+        Select the tokenizer from the settings. Its token names are loaded
+        the first time they're needed.
+        '''
+        self.tokenizer = get_tokenizer()
+        self._constants = None
+
+    def load_token_names(self):
+        '''
+        Get the names of the selected tokenizer's token codes.
+
+        PHP's names are saved in the cache folder, keyed by the PHP binary's
+        path, modification time and size, so they're only asked from PHP once
+        per PHP installation.
+        '''
+        stamp = self.tokenizer.stamp()
+        folder = self.get_cache_folder()
+        if stamp == None or folder == None:
+            return self.tokenizer.token_names()
+
+        path = os.path.join(folder, 'token_names.json')
+        try:
+            saved = json.loads(codecs.open(path, encoding='utf-8', mode='r').read())
+        except (IOError, ValueError):
+            saved = {}
+
+        if stamp in saved:
+            return saved[stamp]['names']
+
+        names = self.tokenizer.token_names()
+        if names:
+            saved[stamp] = {'version': self.tokenizer.version, 'names': names}
+            try:
+                codecs.open(path, encoding='utf-8', mode='w').write(json.dumps(saved))
+            except IOError:
+                pass
+
+        return names
+
+    def get_token_name(self, code):
+        '''
+        Get name for a given token code.
+        '''
+        if self._constants == None:
+            self._constants = self.load_token_names()
+
+        name = None
+        code = str(code)
+        if code in self._constants:
+            name = self._constants[code]
+        return name
+
+    def token(self, token):
+        '''
+        Parse the raw token data into a more consistent form.
+        '''
+        if type(token).__name__ == 'list':
+            kind = self.get_token_name(token[0])
+            stmt = token[1]
+        else:
+            kind = self.get_token_name(0)
+            stmt = token
+
+        return kind, stmt
+
+    def get_class(self, tokens):
+        '''
+        Get the first class definition
+        '''
+        className = None
+        capture_next = False
+        for token in tokens:
+            kind, stmt = self.token(token)
+
+            if kind == 'T_CLASS':
+                # class
+                capture_next = True
+            elif kind == 'T_STRING' and capture_next:
+                className = stmt
+                break
+
+        return className
+
+    def get_parent_class(self, tokens):
+        '''
+        Get the class that the first class definition extends
+        '''
+        className = None
+        capture_next = False
+        for token in tokens:
+            kind, stmt = self.token(token)
+
+            if kind == 'T_EXTENDS':
+                # extends
+                capture_next = True
+            elif kind == 'T_STRING' and capture_next:
+                className = stmt
+                break
+
+        return className
+
+    def get_return_class(self, tokens, searchToken):
+        '''
+        Search tokens for token and return its type.
+
+        When the token is found, return its @var or @return hint
+        '''
+        className = None
+        nest = 0
+        for token in tokens:
+            kind, stmt = self.token(token)
+            if kind == 'T_STRING' and stmt == searchToken and nest == 1:
+                break
+            if stmt == '{':
+                nest += 1
+            if stmt == '}':
+                nest -= 1
+                if nest == 1:
+                    className = ''
+            if kind == None and stmt == ';' and nest == 1:
+                className = ''
+            elif kind == 'T_DOC_COMMENT' and nest == 1:
+                className = re.findall('@var (.*)', stmt)
+                if not className:
+                    className = re.findall('@return (.*)', stmt)
+                if className:
+                    className = className[0].strip()
+
+        return className
+
+    def find_completions(self, document):
+        '''
+        Scan files for completions for the current context
+
+        With the "trace_completions" setting on, the time spent in each phase
+        is recorded for the timing report.
+        '''
+        self.check_checkout()
+
+        if not get_setting('trace_completions', False):
+            return self.lookup_completions(document)
+
+        trace = Trace(document.code[max(0, document.point - 60):document.point].strip().split('\n')[-1])
+        job_context.trace = trace
+        try:
+            return self.lookup_completions(document)
+        finally:
+            job_context.trace = None
+            trace.total = time.time() - trace.started
+            traces.append(trace)
+
+    def lookup_completions(self, document):
+        '''
+        Find the completions at the document's cursor that start with its
+        prefix.
+        '''
+
+        '''Get token to be completed'''
+        point = document.point
+        code, codeTokens, hints, tokens = self.get_buffer(document, point)
+
+        '''
+        Convert the token to a class name.
+
+        First, read the list backwards until we get to an enclosing block or
+        the previous statement.
+        Then create a new token list from that point and iterate forward.
+            Get a class name and parse that file for definitions.
+                The very first token should be a variable or static class name.
+            The next token could be -> or ::.
+            Then the next token should be a method name or class member.
+            Find the return type or member type.
+            Repeat.
+        '''
+        tokens.reverse()
+        nest = 0
+        end = 0
+        for t in tokens:
+            kind, stmt = self.token(t)
+
+            if kind == None and stmt == '(':
+                nest += 1
+            if kind == None and stmt == ')':
+                nest -= 1
+            if kind == None and stmt == ';':
+                break
+            if kind == None and (stmt == '{' or stmt == '}'):
+                break
+            if nest > 0:
+                break
+            end += 1
+
+        tokens = tokens[:end]
+        tokens.reverse()
+
+        className = None
+        nest = 0
+        lastToken = None
+        lastClass = None
+        factory = None
+        symbols = None
+        completing = None
+        for token in tokens:
+            if token:
+                kind, stmt = self.token(token)
+
+                thistoken = [kind, stmt]
+
+                if kind == 'T_WHITESPACE':
+                    # white space
+                    pass
+                elif kind == 'T_VARIABLE' and nest == 0:
+                    # variable
+                    lastToken = thistoken
+                elif kind == 'T_STRING' and nest == 0:
+                    # string (method or class name)
+                    if stmt in FACTORY_METHODS:
+                        factory = stmt
+                    lastToken = thistoken
+                elif kind == None and stmt == '(':
+                    nest += 1
+                elif kind == None and stmt == ')':
+                    nest -= 1
+                elif kind == 'T_CONSTANT_ENCAPSED_STRING' and factory:
+                    lastToken = ['T_STRING', 'Mage::{factory}({path})'.format(factory=factory, path=stmt)]
+                    factory = None
+                elif kind == 'T_OBJECT_OPERATOR' and nest == 0:
+                    # object operator ->
+                    if symbols != None and self.is_member(lastToken):
+                        className = self.get_return_type(symbols, lastToken[1], className)
+                    else:
+                        className = self.convert_token(document, code, lastToken[1], codeTokens, hints)
+                    if not className:
+                        completing = None
+                elif kind == 'T_DOUBLE_COLON' and nest == 0:
+                    # double colon ::
+                    if symbols != None and self.is_member(lastToken):
+                        className = self.get_return_type(symbols, lastToken[1], className)
+                    else:
+                        className = self.convert_token(document, code, lastToken[1], codeTokens, hints)
+                        if not className:
+                            className = lastToken[1]
+
+                if not className:
+                    continue
+
+                if className == lastClass:
+                    continue
+                elif self.is_cancelled():
+                    return []
+                else:
+                    completing = None
+                    lastClass = className
+
+                    '''Build path to source class'''
+                    path = self.build_magento_path(className)
+                    if not path:
+                        return []
+
+                    '''Scan source for functions'''
+                    if kind == 'T_DOUBLE_COLON' or lastToken[1] == 'self' or lastToken[1] == 'parent':
+                        context = 'static'
+                    elif lastToken[1].startswith('$this'):
+                        context = 'private'
+                    else:
+                        context = 'public'
+                    symbols = self.get_symbols(className, context)
+                    if not symbols:
+                        return []
+                    completing = (className, context)
+
+        if completing == None:
+            return []
+
+        '''Return snippets'''
+        start = time.time()
+        data = self.get_completion_index(*completing).find(document.prefix)
+        trace_phase('snippets', time.time() - start)
+
+        return data
+
+    def is_member(self, token):
+        '''
+        Check if a token in a chain names a method or property, rather than a
+        variable or a factory call.
+        '''
+        return token[0] == 'T_STRING' and not FACTORY_CALL.match(token[1])
+
+    def get_return_type(self, symbols, name, className):
+        '''
+        Get the class returned by a method or property of className from its
+        symbol table.
+
+        The table has the @return type of every method the class defines or
+        inherits, so each link in a chain is a dictionary lookup. $this and
+        static mean className itself, self means the class that declared it.
+        '''
+        symbol = symbols.get(name)
+        if symbol == None:
+            symbol = symbols.get('$' + name)
+        if symbol == None or not symbol.returnType:
+            return None
+
+        returnType = symbol.returnType
+        if returnType in ('$this', 'static'):
+            return className
+        if returnType == 'self':
+            return symbol.className
+
+        return returnType
+
+    @traced('convert_token')
+    def convert_token(self, document, code, token, tokens=None, hints=None):
+        '''
+        Given a token, convert it into a Magento class name.
+
+        If the token is a variable (e.g. $var) then we look up its @var hint
+            or parameter type in the scope around the cursor.
+        If the token is a Magento factory class, then look up its alias in
+            the config.xml files.
+        tokens and hints are the tokens and hint index for code, if they're
+        already known.
+        '''
+        className = None
+        token = token.strip()
+
+        if token.startswith('$this') or token == 'self':
+            if tokens == None:
+                tokens = self.get_all_tokens(code)
+            className = self.get_class(tokens)
+
+        elif token == 'parent':
+            if tokens == None:
+                tokens = self.get_all_tokens(code)
+            className = self.get_parent_class(tokens)
+
+        elif token.startswith('$'):
+            if hints == None:
+                hints = HintIndex()
+                tokens = tokens or self.get_all_tokens(code)
+                marks = []
+                offsets = []
+                offset = 0
+                for i in range(0, len(tokens)):
+                    kind, stmt = self.token(tokens[i])
+                    if is_hint_mark(kind, stmt):
+                        marks.append(i)
+                    offsets.append(offset)
+                    offset += len(stmt)
+                hints.build(tokens, offsets, marks, self.token)
+            className = hints.find(token, document.point)
+
+        elif FACTORY_CALL.match(token):
+            method, alias = FACTORY_CALL.match(token).groups()
+            className = self.get_factory_aliases().resolve(FACTORY_METHODS[method], alias)
+
+        elif token == 'Mage':
+            className = 'Mage'
+
+        else:
+            if tokens == None:
+                tokens = self.get_all_tokens(code)
+            className = self.get_return_class(tokens, token)
+
+        return className
+
+    @traced('scan_file')
+    def scan_file(self, file, context='public'):
+        '''
+        Find the functions, properties and constants defined in a file that
+        can be used in a context.
+
+        The file is parsed once into a table of all its symbols, and the
+        table is kept in the symbol cache until the file's modification time
+        or size changes. The symbols for each context are filtered from that
+        table.
+        '''
+        cached = symbol_cache.get(file)
+        now = time.time()
+        if not cached or now - cached['checked'] >= SYMBOL_CACHE_RECHECK:
+            try:
+                stat = os.stat(file)
+            except OSError:
+                return {}
+
+            if cached and cached['mtime'] == stat.st_mtime and cached['size'] == stat.st_size:
+                cached['checked'] = now
+                trace_count('symbol cache hits')
+            else:
+                trace_count('symbol cache misses')
+                indexed = self.find_indexed(file, stat)
+                if indexed:
+                    symbols = indexed[3]
+                else:
+                    source = codecs.open(file, encoding='utf-8', mode='r', errors='replace').read()
+                    symbols = self.extract_symbols(self.get_all_tokens(source))
+                    record_usage(file, source)
+
+                size = 0
+                for name in symbols:
+                    size += SYMBOL_SIZE + len(name) * 2 + sum([len(a) * 2 for a in symbols[name].args])
+                cached = {'mtime': stat.st_mtime, 'size': stat.st_size, 'checked': now,
+                    'symbols': symbols, 'contexts': {}}
+                symbol_cache.limit = get_setting('symbol_cache_size', 32) * 1024 * 1024
+                symbol_cache.put(file, cached, size)
+        else:
+            trace_count('symbol cache hits')
+
+        if context not in cached['contexts']:
+            cached['contexts'][context] = filter_symbols(cached['symbols'], context)
+
+        return cached['contexts'][context]
+
+    def extract_symbols(self, tokens):
+        '''
+        Collect the members of the classes in a token list in a single pass.
+
+        Each function, property and constant is recorded with its kind,
+        visibility, static flag, arguments, return type and class. The return
+        type comes from the docblock's @return (or @var for properties), or
+        from a return type declaration.
+        '''
+        symbols = {}
+        depth = 0
+        classDepth = None
+        inClass = False
+        className = ''
+        previous = None
+        modifiers = []
+        doc = None
+        inConst = False
+        brackets = 0
+
+        i = 0
+        count = len(tokens)
+        while i < count:
+            kind, stmt = self.token(tokens[i])
+            i += 1
+
+            if kind in ('T_WHITESPACE', 'T_COMMENT'):
+                continue
+
+            if kind in ('T_CLASS', 'T_INTERFACE', 'T_TRAIT') and classDepth == None and previous != 'T_DOUBLE_COLON':
+                inClass = True
+            elif kind == 'T_STRING' and previous in ('T_CLASS', 'T_INTERFACE', 'T_TRAIT') and inClass:
+                className = intern_string(stmt)
+            elif stmt == '{' or kind in ('T_CURLY_OPEN', 'T_DOLLAR_OPEN_CURLY_BRACES'):
+                depth += 1
+                if inClass:
+                    classDepth = depth
+                    inClass = False
+            elif stmt == '}':
+                if depth == classDepth:
+                    classDepth = None
+                depth -= 1
+            elif depth == classDepth:
+                if kind == 'T_DOC_COMMENT':
+                    doc = stmt
+                elif kind in MEMBER_MODIFIERS:
+                    modifiers.append(kind)
+                elif kind == 'T_CONST':
+                    inConst = True
+                elif stmt == '(' or stmt == '[':
+                    brackets += 1
+                elif stmt == ')' or stmt == ']':
+                    brackets -= 1
+                elif brackets > 0:
+                    # Names inside an initializer like array(FOO, BAR) aren't members
+                    pass
+                elif kind == 'T_STRING' and inConst and previous in ('T_CONST', ','):
+                    symbols[intern_string(stmt)] = self.make_symbol('constant', modifiers, doc, className)
+                elif kind == 'T_VARIABLE' and modifiers and previous in MEMBER_MODIFIERS + (',',):
+                    symbols[intern_string(stmt)] = self.make_symbol('variable', modifiers, doc, className)
+                elif kind == 'T_FUNCTION':
+                    name = None
+                    args = []
+                    nest = 0
+                    while i < count:
+                        kind, stmt = self.token(tokens[i])
+                        i += 1
+                        if kind == 'T_STRING' and name == None and nest == 0:
+                            name = stmt
+                        elif stmt == '(':
+                            nest += 1
+                        elif stmt == ')':
+                            nest -= 1
+                            if nest == 0:
+                                break
+                        elif kind == 'T_VARIABLE' and nest == 1:
+                            args.append(intern_string(stmt))
+
+                    symbol = self.make_symbol('function', modifiers, doc, className, tuple(args))
+                    if not symbol.returnType:
+                        symbol.returnType = intern_string(self.get_declared_type(tokens, i))
+                    if name:
+                        symbols[intern_string(name)] = symbol
+                    modifiers = []
+                    doc = None
+                elif stmt == ';':
+                    modifiers = []
+                    doc = None
+                    inConst = False
+                    brackets = 0
+
+            if kind == None:
+                previous = stmt
+            else:
+                previous = kind
+
+        return symbols
+
+    def make_symbol(self, kind, modifiers, doc, className, args=()):
+        '''
+        Create a symbol table entry for a class member.
+        '''
+        visibility = 'public'
+        for modifier in ('T_PROTECTED', 'T_PRIVATE'):
+            if modifier in modifiers:
+                visibility = intern_string(modifier[2:].lower())
+
+        returnType = ''
+        if doc:
+            found = re.search('@(?:return|var)\\s+([^\\s|*]+)', doc)
+            if found:
+                returnType = intern_string(found.group(1).lstrip('\\'))
+
+        return Symbol(kind, args, returnType, visibility, 'T_STATIC' in modifiers or kind == 'constant', className)
+
+    def get_declared_type(self, tokens, i):
+        '''
+        Get the return type declared after a function's argument list, which
+        ends just before tokens[i].
+        '''
+        colon = False
+        declared = ''
+        while i < len(tokens):
+            kind, stmt = self.token(tokens[i])
+            i += 1
+            if kind == 'T_WHITESPACE' or stmt == '?':
+                continue
+            if stmt == ':' and not colon:
+                colon = True
+            elif kind in ('T_STRING', 'T_NS_SEPARATOR') and colon:
+                declared += stmt
+            else:
+                break
+
+        return declared.lstrip('\\')
+
+    def get_symbols(self, className, context='public'):
+        '''
+        Get the symbols for a class, including the ones it inherits.
+
+        Symbol tables are merged from the top of the inheritance chain down,
+        so a class's own definitions override its parents', and the methods
+        any class defines override magic getters and setters. Merged tables are cached and
+        rechecked against the files in the chain like scan_file's results.
+        '''
+        key = (className, context)
+        cached = merged_symbol_cache.get(key)
+        now = time.time()
+        if cached and now - cached['checked'] < SYMBOL_CACHE_RECHECK:
+            return cached['symbols']
+
+        chain = self.get_class_chain(className)
+        stamps = []
+        for name, path in chain:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return {}
+            stamps.append((path, stat.st_mtime, stat.st_size))
+        if chain:
+            stamps.append(('attributes', self.get_attribute_map().updated))
+
+        if cached and cached['stamps'] == stamps:
+            cached['checked'] = now
+            return cached['symbols']
+
+        symbols = {}
+        size = 0
+        if context != 'static':
+            symbols = self.get_magic_symbols(className, chain)
+            size += len(symbols) * SYMBOL_SIZE
+
+        chain.reverse()
+        for name, path in chain:
+            for symbol, definition in self.scan_file(file=path, context=context).items():
+                symbols[symbol] = definition
+                size += MERGED_SYMBOL_SIZE
+
+        merged_symbol_cache.limit = get_setting('symbol_cache_size', 32) * 1024 * 1024
+        merged_symbol_cache.put(key, {'checked': now, 'stamps': stamps, 'classes': [name for name, path in chain],
+            'symbols': symbols}, size)
+
+        return symbols
+
+    def get_completion_index(self, className, context):
+        '''
+        Get the completion index for a class's symbols in a context. It's
+        kept with the merged symbol table and rebuilt when the table is.
+        '''
+        symbols = self.get_symbols(className, context)
+        cached = merged_symbol_cache.get((className, context))
+        if cached == None:
+            return CompletionIndex(symbols)
+
+        index = cached.get('completions')
+        if index == None or index.symbols is not symbols:
+            index = CompletionIndex(symbols)
+            cached['completions'] = index
+
+        return index
+
+    def get_magic_symbols(self, className, chain):
+        '''
+        Get the magic getters and setters of a Varien_Object model, from the
+        attributes of the entity that it, or the nearest ancestor that does,
+        passes to _init().
+        '''
+        names = [name for name, path in chain]
+        if 'Varien_Object' not in names:
+            return {}
+
+        keys = []
+        for name, path in chain:
+            entity = self.get_entity_of(path)
+            if entity:
+                keys.append(entity)
+                break
+        keys.extend(['class:' + name for name in names])
+
+        return magic_symbols(self.get_attribute_map().find(keys), className)
+
+    def get_class_chain(self, className):
+        '''
+        Get a class and its ancestors as (className, path) pairs, starting
+        with the class itself.
+        '''
+        chain = []
+        seen = set()
+        while className and className not in seen:
+            path = self.build_magento_path(className)
+            if not path:
+                break
+            chain.append((className, path))
+            seen.add(className)
+            className = self.get_parent_of(path)
+
+        return chain
+
+    def get_parent_of(self, path):
+        '''
+        Get the parent of the class defined in a file, using the class
+        hierarchy graph.
+        '''
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        known = class_parents.get(path)
+        if known and known[0] == stat.st_mtime and known[1] == stat.st_size:
+            return known[2]
+
+        indexed = self.find_indexed(path, stat)
+        if indexed:
+            parent = indexed[2]
+        else:
+            source = codecs.open(path, encoding='utf-8', mode='r', errors='replace').read()
+            parent = self.get_parent_class(self.get_all_tokens(source))
+        class_parents[path] = (stat.st_mtime, stat.st_size, parent)
+
+        return parent
+
+    def get_entity_of(self, path):
+        '''
+        Get the entity alias a model file passes to _init(), if any.
+        '''
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        known = class_entities.get(path)
+        if known and known[0] == stat.st_mtime and known[1] == stat.st_size:
+            return known[2]
+
+        found = MODEL_INIT.search(codecs.open(path, encoding='utf-8', mode='r', errors='replace').read())
+        entity = found and found.group(1)
+        class_entities[path] = (stat.st_mtime, stat.st_size, entity)
+
+        return entity
+
+    @traced('build_magento_path')
+    def build_magento_path(self, className):
+        '''
+        Build a file path given a Magento class name.
+
+        Uses the class index once it's ready. Until then, searches the code
+        pools in the same order as the index and Magento's autoloader: local,
+        community, core, lib and app. Factory aliases are resolved from config.xml
+        so there's no need to search other vendors' folders for a guessed
+        Mage_ class name.
+        '''
+        if className == None:
+            return
+
+        root = self.get_root_folder()
+        if root == None:
+            return
+
+        index = self.get_class_index()
+        self.counters['lookups'] += 1
+        if index.ready:
+            return index.find(className)
+
+        '''
+        Look for the class file in the code pools the project has, so a local
+        override wins over the core class it replaces
+        '''
+        pools = get_project().pools
+        for pool, folders in CODE_POOLS:
+            if pool in pools:
+                path = os.path.join(pools[pool], *className.split('_')) + '.php'
+                if self.probe(path):
+                    return path
+
+        return None
+
+    def probe(self, path):
+        '''
+        Check if a class file exists, counting the check.
+        '''
+        self.counters['probes'] += 1
+        trace_count('file system probes')
+        return os.path.isfile(path)
+
+    def get_token_store(self):
+        '''
+        Get the token store in the cache folder.
+
+        The first time the store is opened any files left by the old
+        one-file-per-md5 cache are deleted in the background.
+        '''
+        folder = self.get_cache_folder()
+        store = token_stores.get(folder)
+        if store == None:
+            store = TokenStore(os.path.join(folder, 'tokens.log'), 0)
+            token_stores[folder] = store
+            thread = threading.Thread(target=remove_legacy_cache, args=(folder,))
+            thread.daemon = True
+            thread.start()
+        store.limit = get_setting('token_cache_size', 64) * 1024 * 1024
+
+        return store
+
+    def get_factory_aliases(self):
+        '''
+        Get the factory alias table for the current Magento installation.
+        '''
+        root = self.get_root_folder()
+        aliases = factory_aliases.get(root)
+        if aliases == None:
+            aliases = FactoryAliases(root, os.path.join(self.get_cache_folder(), 'aliases.json'))
+            factory_aliases[root] = aliases
+            aliases.load()
+            aliases.refresh_in_background(force=True)
+
+        return aliases
+
+    def get_class_index(self):
+        '''
+        Get the class index for the current Magento installation.
+
+        The index is shared by everything that resolves class names. It's
+        loaded and refreshed in the background the first time it's used.
+        '''
+        root = self.get_root_folder()
+        index = class_indexes.get(root)
+        if index == None:
+            index = ClassIndex(root, os.path.join(self.get_cache_folder(), 'classes.json'))
+            class_indexes[root] = index
+            index.load()
+            index.refresh_in_background(force=True)
+
+        return index
+
+    def check_checkout(self):
+        '''
+        Check if a git checkout changed the project's files.
+
+        If so, the cached symbols are checked against their files before
+        they're used again, and the indexes are brought up to date in the
+        background. The class index sweeps the code pools' modification
+        times and forgets what's cached about the files that changed, so
+        nothing else has to be rebuilt.
+        '''
+        root = self.get_root_folder()
+        if root == None:
+            return
+
+        checkout = checkouts.get(root)
+        if checkout == None:
+            checkouts[root] = GitCheckout(root)
+            return
+        if not checkout.changed():
+            return
+
+        for cached in symbol_cache.values() + merged_symbol_cache.values():
+            cached['checked'] = 0
+
+        self.get_class_index().refresh_in_background(force=True)
+        self.get_factory_aliases().refresh_in_background(force=True)
+        symbols = symbol_indexes.get(root)
+        if symbols and symbols.ready:
+            symbols.refresh_in_background(force=True)
+
+    def get_attribute_map(self):
+        '''
+        Get the attribute map for the current Magento installation, as last
+        imported. It's empty until it's imported on request.
+        '''
+        root = self.get_root_folder()
+        attributes = attribute_maps.get(root)
+        if attributes == None:
+            attributes = AttributeMap(root, os.path.join(self.get_cache_folder(), 'attributes.json'),
+                self.get_factory_aliases())
+            attribute_maps[root] = attributes
+            attributes.load()
+
+        return attributes
+
+    def get_symbol_index(self):
+        '''
+        Get the symbol index for the current Magento installation.
+
+        If the project was indexed before, the saved index is loaded and
+        brought up to date in the background the first time it's used.
+        Otherwise it stays empty until it's built on request.
+        '''
+        root = self.get_root_folder()
+        index = symbol_indexes.get(root)
+        if index == None:
+            index = SymbolIndex(root, os.path.join(self.get_cache_folder(), 'symbols.json'))
+            symbol_indexes[root] = index
+            if os.path.exists(index.cachefile):
+                index.refresh_in_background(force=True)
+
+        return index
+
+    def find_indexed(self, path, stat):
+        '''
+        Get a file's symbol index entry, if the project was indexed and the
+        file hasn't changed since.
+        '''
+        if self.get_root_folder() == None:
+            return None
+
+        return self.get_symbol_index().find(path, stat)
+
+    def get_root_folder(self):
+        '''
+        Get the root Magento folder
+        '''
+        return get_project().root
+
+
+def find_program(name):
+    '''
+    Find a program on the path.
+    '''
+    for folder in os.environ.get('PATH', '').split(os.pathsep):
+        for suffix in ('', '.exe'):
+            path = os.path.join(folder, name + suffix)
+            if os.path.isfile(path) and os.access(path, os.X_OK):
+                return path
+
+    return None
+
+
+def cap_first_letter(word):
+    return word[0].upper() + word[1:]
+
+
+def get_setting(name, default=None):
+    settings = getattr(job_context, 'settings', None)
+    if settings != None:
+        value = settings.get(name)
+        if value == None:
+            return default
+        return value
+
+    return environment.get_setting(name, default)
+
+
+def window_folders():
+    '''
+    Get the project folders, or the ones captured for the completion job
+    running on this thread.
+    '''
+    folders = getattr(job_context, 'folders', None)
+    if folders != None:
+        return folders
+
+    return environment.get_folders()
+
+
+def is_magento():
+    return get_project().root != None
@@ -0,0 +1,119 @@
+<?php
+/**
+ * Catalog product model
+ *
+ * @method Mage_Catalog_Model_Resource_Product getResource()
+ * @method int getStoreId()
+ */
+class Mage_Catalog_Model_Product extends Mage_Catalog_Model_Abstract
+{
+    const ENTITY                 = 'catalog_product';
+
+    const CACHE_TAG              = 'catalog_product';
+    protected $_cacheTag         = 'catalog_product';
+    protected $_eventPrefix      = 'catalog_product';
+    protected $_eventObject      = 'product';
+    protected $_canAffectOptions = false;
+
+    protected $_calculatePrice = true;
+
+    protected function _construct()
+    {
+        $this->_init('catalog/product');
+    }
+
+    public function getPrice()
+    {
+        if ($this->_calculatePrice || !$this->getData('price')) {
+            return $this->getPriceModel()->getPrice($this);
+        } else {
+            return $this->getData('price');
+        }
+    }
+
+    public function getFinalPrice($qty=null)
+    {
+        $price = $this->_getData('final_price');
+        if ($price !== null) {
+            return $price;
+        }
+        return $this->getPriceModel()->getFinalPrice($qty, $this);
+    }
+
+    public function getWeight()
+    {
+        $weight = (float)$this->_getData('weight');
+        return $weight > 0.0 ? round($weight, 4) : 1e-4;
+    }
+
+    public function getCategoryIds()
+    {
+        if (! $this->hasData('category_ids')) {
+            $wasLocked = false;
+            if ($this->isLockedAttribute('category_ids')) {
+                $wasLocked = true;
+                $this->unlockAttribute('category_ids');
+            }
+            $ids = $this->_getResource()->getCategoryIds($this);
+            $this->setData('category_ids', $ids);
+            if ($wasLocked) {
+                $this->lockAttribute('category_ids');
+            }
+        }
+
+        return (array) $this->_getData('category_ids');
+    }
+
+    protected function _beforeSave()
+    {
+        $this->cleanCache();
+        $this->setTypeHasOptions(false);
+        $this->setTypeHasRequiredOptions(false);
+
+        $this->getTypeInstance(true)->beforeSave($this);
+
+        $hasOptions         = false;
+        $hasRequiredOptions = false;
+
+        $this->canAffectOptions($this->_canAffectOptions && $this->getCanSaveCustomOptions());
+        if ($this->getCanSaveCustomOptions()) {
+            $options = $this->getProductOptions();
+            if (is_array($options)) {
+                $this->setIsCustomOptionChanged(true);
+                foreach ($this->getProductOptions() as $option) {
+                    $this->getOptionInstance()->addOption($option);
+                    if ((!isset($option['is_delete'])) || $option['is_delete'] != '1') {
+                        $hasOptions = true;
+                    }
+                }
+            }
+        }
+
+        parent::_beforeSave();
+    }
+
+    public function getAttributeText($attributeCode)
+    {
+        return $this->getResource()
+            ->getAttribute($attributeCode)
+                ->getSource()
+                    ->getOptionText($this->getData($attributeCode));
+    }
+
+    public function getStockQty($limit = 0x7FFFFFFF)
+    {
+        $qty = 0;
+        for ($i = 0; $i < $limit; ++$i) {
+            $qty += $this->_stock[$i]['qty'] ?? 0;
+        }
+        $qty -= @$this->_reserved;
+        return min($qty, $limit) <=> 0 ? $qty : -1;
+    }
+
+    public function toString($format = '')
+    {
+        $label = static::ENTITY . ':' . __CLASS__;
+        $label .= $format ? " {$format}" : '';
+        return $label;
+    }
+}
@@ -0,0 +1,67 @@
+<?php
+/**
+ * Core data helper
+ *
+ * @author      Magento Core Team <core@magentocommerce.com>
+ */
+class Mage_Core_Helper_String extends Mage_Core_Helper_Abstract
+{
+    const ICONV_CHARSET = 'UTF-8';
+
+    const UTF8_BOM = b"\xEF\xBB\xBF";
+
+    protected $_prefix = 'core';
+
+    public function stripBom($text)
+    {
+        if (substr($text, 0, 3) === self::UTF8_BOM) {
+            return substr($text, 3);
+        }
+        return $text;
+    }
+
+    public function isBinary($value)
+    {
+        return strpos($value, b'\0') !== false || B'it\'s' === $value;
+    }
+
+    public function getCacheKey($key, $items = array())
+    {
+        $id = "{$this->_prefix}_{$key}";
+        foreach ($items as $item) {
+            $id .= "-$item[0]-$item[name]-$item->sku";
+        }
+        return b"$id:${key}s";
+    }
+
+    public function quoteIdentifier($name)
+    {
+        return "`" . str_replace("`", "``", $name) . "`";
+    }
+
+    public function renderSql($table, $column)
+    {
+        $sql = <<<SQL
+SELECT `{$column}` FROM $table
+ WHERE {$this->_prefix}_id = ?
+SQL;
+        $sql .= b<<<"SQL"
+ LIMIT 1
+SQL;
+        $help = <<<'TEXT'
+No $variables {$here}
+TEXT;
+        return array($sql, $help, (binary) $column, (string)$table, (int) '42');
+    }
+
+    public function splitWords($str, $uniqueOnly = false, $maxCount = 0, $wordSeparatorRegexp = '\s')
+    {
+        $result = array();
+        $split = preg_split('#' . $wordSeparatorRegexp . '#siu', $str, null, PREG_SPLIT_NO_EMPTY);
+        # limit the result
+        if ($maxCount > 0 && count($split) > $maxCount) {
+            $split = array_slice($split, 0, $maxCount);
+        }
+        return $uniqueOnly ? array_unique($split) : $split; /* unique words */
+    }
+}
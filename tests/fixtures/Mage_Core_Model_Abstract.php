@@ -0,0 +1,120 @@
+<?php
+/**
+ * Abstract model class
+ *
+ * @category    Mage
+ * @package     Mage_Core
+ */
+abstract class Mage_Core_Model_Abstract extends Varien_Object
+{
+    /**
+     * Prefix of model events names
+     *
+     * @var string
+     */
+    protected $_eventPrefix = 'core_abstract';
+
+    protected $_eventObject = 'object';
+
+    protected $_resourceName;
+
+    protected $_isDeleted = false;
+
+    protected function _init($resourceModel)
+    {
+        $this->_setResourceModel($resourceModel);
+    }
+
+    protected function _getResource()
+    {
+        if (empty($this->_resourceName)) {
+            Mage::throwException(Mage::helper('core')->__('Resource is not set.'));
+        }
+
+        return Mage::getResourceSingleton($this->_resourceName);
+    }
+
+    public function getId()
+    {
+        $fieldName = $this->getIdFieldName();
+        if ($fieldName) {
+            return $this->_getData($fieldName);
+        } else {
+            return $this->_getData('id');
+        }
+    }
+
+    public function save()
+    {
+        /**
+         * Direct deleted items to delete method
+         */
+        if ($this->isDeleted()) {
+            return $this->delete();
+        }
+        if (!$this->_hasModelChanged()) {
+            return $this;
+        }
+        $this->_getResource()->beginTransaction();
+        $dataCommited = false;
+        try {
+            $this->_beforeSave();
+            if ($this->_dataSaveAllowed) {
+                $this->_getResource()->save($this);
+                $this->_afterSave();
+            }
+            $this->_getResource()->addCommitCallback(array($this, 'afterCommitCallback'))
+                ->commit();
+            $this->_hasDataChanges = false;
+            $dataCommited = true;
+        } catch (Exception $e) {
+            $this->_getResource()->rollBack();
+            $this->_hasDataChanges = true;
+            throw $e;
+        }
+        if ($dataCommited) {
+            $this->_afterSaveCommit();
+        }
+        return $this;
+    }
+
+    protected function _getEventData()
+    {
+        return array(
+            'data_object'       => $this,
+            $this->_eventObject => $this,
+        );
+    }
+
+    protected function _afterLoad()
+    {
+        Mage::dispatchEvent('model_load_after', array('object'=>$this));
+        Mage::dispatchEvent($this->_eventPrefix.'_load_after', $this->_getEventData());
+        return $this;
+    }
+
+    public function isDeleted($isDeleted=null)
+    {
+        $result = $this->_isDeleted;
+        if (!is_null($isDeleted)) {
+            $this->_isDeleted = (bool) $isDeleted;
+        }
+        return $result;
+    }
+
+    public function getCacheIdTags()
+    {
+        $tags = false;
+        if ($this->getId() && $this->_cacheTag) {
+            $tags = array();
+            if (is_array($this->_cacheTag)) {
+                foreach ($this->_cacheTag as $_tag) {
+                    $tags[] = $_tag.'_'.$this->getId();
+                }
+            } else {
+                $tags[] = $this->_cacheTag.'_'.$this->getId();
+            }
+        }
+        return $tags;
+    }
+}
@@ -0,0 +1,104 @@
+<?php
+/**
+ * Varien Object
+ *
+ * @category   Varien
+ * @package    Varien_Object
+ */
+class Varien_Object implements ArrayAccess
+{
+    /**
+     * Object attributes
+     *
+     * @var array
+     */
+    protected $_data = array();
+
+    protected $_hasDataChanges = false;
+
+    /**
+     * Setter/Getter underscore transformation cache
+     *
+     * @var array
+     */
+    protected static $_underscoreCache = array();
+
+    public function __construct()
+    {
+        $args = func_get_args();
+        if (empty($args[0])) {
+            $args[0] = array();
+        }
+        $this->_data = $args[0];
+        $this->_construct();
+    }
+
+    public function getData($key='', $index=null)
+    {
+        if (''===$key) {
+            return $this->_data;
+        }
+
+        $default = null;
+
+        // accept a/b/c as ['a']['b']['c']
+        if (strpos($key,'/')) {
+            $keyArr = explode('/', $key);
+            $data = $this->_data;
+            foreach ($keyArr as $i=>$k) {
+                if ($k==='') {
+                    return $default;
+                }
+                if (is_array($data)) {
+                    if (!isset($data[$k])) {
+                        return $default;
+                    }
+                    $data = $data[$k];
+                } elseif ($data instanceof Varien_Object) {
+                    $data = $data->getData($k);
+                } else {
+                    return $default;
+                }
+            }
+            return $data;
+        }
+
+        return isset($this->_data[$key]) ? $this->_data[$key] : $default;
+    }
+
+    public function __call($method, $args)
+    {
+        switch (substr($method, 0, 3)) {
+            case 'get' :
+                $key = $this->_underscore(substr($method,3));
+                $data = $this->getData($key, isset($args[0]) ? $args[0] : null);
+                return $data;
+
+            case 'set' :
+                $key = $this->_underscore(substr($method,3));
+                $result = $this->setData($key, isset($args[0]) ? $args[0] : null);
+                return $result;
+
+            case 'uns' :
+                $key = $this->_underscore(substr($method,3));
+                return $this->unsetData($key);
+        }
+        throw new Varien_Exception("Invalid method ".get_class($this)."::".$method."(".print_r($args,1).")");
+    }
+
+    protected function _underscore($name)
+    {
+        if (isset(self::$_underscoreCache[$name])) {
+            return self::$_underscoreCache[$name];
+        }
+        #Varien_Profiler::start('underscore');
+        $result = strtolower(preg_replace('/(.)([A-Z])/', "$1_$2", $name));
+        self::$_underscoreCache[$name] = $result;
+        return $result;
+    }
+
+    public function offsetExists($offset)
+    {
+        return isset($this->_data[$offset]);
+    }
+}
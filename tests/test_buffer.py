@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+'''
+Tests for BufferTokens, which re-tokenizes only the part of a buffer that
+changed. After any edit its tokens have to match tokenizing the whole code.
+'''
+
+import codecs
+import glob
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import magentointel_engine
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+'''
+Snippets inserted by the random edits, picked to open and close strings,
+comments, heredocs, property lookups and PHP blocks.
+'''
+SNIPPETS = (u' ', u'\n', u'->', u' /* c */ ', u'if', u'$x', u"'", u'"', u'{', u'}', u'(', u')', u';',
+    u'//', u'/*', u'*/', u'<?php ', u'?>', u'<<<EOT\n', u'\nEOT;\n', u'b"$v"', u'{$y}', u'class')
+
+NAMES = magentointel_engine.PythonTokenizer().token_names()
+
+
+def tokenize(code, inline):
+    return magentointel_engine.PhpLexer(code).tokenize(inline)
+
+
+def token(t):
+    if type(t).__name__ == 'list':
+        return NAMES.get(str(t[0])), t[1]
+    return None, t
+
+
+def edit(rand, code):
+    '''
+    Insert, delete or replace a bit of code at a random point.
+    '''
+    start = rand.randint(0, len(code))
+    end = start
+    if rand.random() < 0.5:
+        end = min(len(code), start + rand.randint(1, 8))
+    text = u''
+    for i in range(0, rand.randint(0, 3)):
+        text += rand.choice(SNIPPETS)
+
+    return code[:start] + text + code[end:]
+
+
+class BufferTokensTest(unittest.TestCase):
+
+    def check_edits(self, seed, path, edits=40):
+        rand = random.Random(seed)
+        code = codecs.open(path, encoding='utf-8', mode='r').read()
+        buffer = magentointel_engine.BufferTokens(None)
+        for i in range(0, edits):
+            code = edit(rand, code)
+            buffer.update(code, tokenize, token)
+            message = '{file}, seed {seed}, edit {edit}'.format(file=os.path.basename(path), seed=seed, edit=i)
+            self.assertEqual(buffer.tokens, tokenize(code, True), message)
+
+            point = rand.randint(0, len(code))
+            self.assertEqual(buffer.tokens_before(point, tokenize), tokenize(code[:point], True),
+                '{message}, tokens before {point}'.format(message=message, point=point))
+
+    def test_random_edits(self):
+        paths = sorted(glob.glob(os.path.join(FIXTURES, '*.php*')))
+        self.assertTrue(paths)
+        for seed in range(0, 5):
+            for path in paths:
+                self.check_edits(seed, path)
+
+    def test_open_ended_fragments(self):
+        for code in (u'$x->', u'$x-> /* c */', u'$x->\n// c\n', u'f( /** d */'):
+            fragment = tokenize(code, False)
+            self.assertFalse(magentointel_engine.is_closed_fragment(fragment, token), code)
+        self.assertTrue(magentointel_engine.is_closed_fragment(tokenize(u'$x->y /* c */', False), token))
+
+    def test_tokenizer_failure(self):
+        code = u'<?php\n$x = 1;\n$y = 2;\n'
+        buffer = magentointel_engine.BufferTokens(None)
+        buffer.update(code, tokenize, token)
+
+        failed = lambda code, inline: []
+        buffer.update(code + u'$z = 3;\n', failed, token)
+        self.assertEqual(buffer.tokens, [])
+        self.assertEqual(buffer.code, u'')
+
+        code += u'$z = 3;\n'
+        buffer.update(code, tokenize, token)
+        self.assertEqual(buffer.tokens, tokenize(code, True))
+
+
+if __name__ == '__main__':
+    unittest.main()
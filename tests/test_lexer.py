@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+
+'''
+Tests for the pure Python PHP lexer.
+
+Fixtures with a JSON file next to them are compared with the tokens PHP's
+token_get_all() returned for them. The JSON files are recorded by PHP itself,
+along with the names of the token codes, since the codes change between PHP
+versions, so PHP isn't needed to run the tests. To copy Magento core files
+into fixtures/ and record every fixture, run this module with PHP on the path:
+
+    python tests/test_lexer.py record app/code/core/Mage/Core/Model/Abstract.php ...
+'''
+
+import codecs
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import magentointel_engine
+
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+RECORD_SCRIPT = '''
+$tokens = token_get_all(file_get_contents('php://stdin'));
+$names = array();
+foreach ($tokens as $token) {
+    if (is_array($token)) {
+        $names[$token[0]] = token_name($token[0]);
+    }
+}
+echo json_encode(array('php' => PHP_VERSION, 'names' => $names, 'tokens' => $tokens));
+'''
+
+
+def fixture_files():
+    '''
+    List the PHP files of the fixtures.
+    '''
+    return sorted(glob.glob(os.path.join(FIXTURES, '*.php')) + glob.glob(os.path.join(FIXTURES, '*.phtml')))
+
+
+def expected_file(path):
+    return os.path.splitext(path)[0] + '.json'
+
+
+def describe(token, names):
+    if type(token).__name__ == 'list':
+        return '{name} {text!r} on line {line}'.format(name=names.get(str(token[0])), text=token[1],
+            line=token[2])
+    return repr(token)
+
+
+def lex(code):
+    '''
+    Tokenize code with PhpLexer and name the tokens.
+    '''
+    names = magentointel_engine.PythonTokenizer().token_names()
+    named = []
+    for token in magentointel_engine.PhpLexer(code).tokenize():
+        if type(token).__name__ == 'list':
+            named.append((names[str(token[0])], token[1]))
+        else:
+            named.append(token)
+
+    return named
+
+
+def record(path):
+    '''
+    Record the tokens of a fixture with PHP's token_get_all().
+
+    Tokens are written one per line so changes to a fixture diff cleanly.
+    '''
+    source = open(path, 'rb').read()
+    process = subprocess.Popen(['php', '-d', 'display_errors=stderr', '-r', RECORD_SCRIPT], stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE)
+    output = process.communicate(source)[0]
+    data = json.loads(output.decode('utf-8'))
+
+    names = data['names'] or {}
+    lines = []
+    for code in sorted(names.keys(), key=int):
+        lines.append('    {code}: {name}'.format(code=json.dumps(code), name=json.dumps(names[code])))
+    tokens = []
+    for token in data['tokens']:
+        tokens.append('    ' + json.dumps(token))
+
+    out = codecs.open(expected_file(path), encoding='utf-8', mode='w')
+    out.write(u'{\n  "php": ' + json.dumps(data['php']) + u',\n  "names": {\n' + u',\n'.join(lines) +
+        u'\n  },\n  "tokens": [\n' + u',\n'.join(tokens) + u'\n  ]\n}\n')
+    out.close()
+
+
+class PhpLexerTest(unittest.TestCase):
+
+    def test_fixtures(self):
+        lexerNames = magentointel_engine.PythonTokenizer().token_names()
+        for path in fixture_files():
+            if not os.path.exists(expected_file(path)):
+                continue
+            source = codecs.open(path, encoding='utf-8', mode='r').read()
+            expected = json.loads(codecs.open(expected_file(path), encoding='utf-8', mode='r').read())
+            self.assertTrue(expected.get('php'), '{file} was not recorded by PHP'.format(file=expected_file(path)))
+
+            tokens = magentointel_engine.PhpLexer(source).tokenize()
+            i = magentointel_engine.compare_tokens(tokens, lexerNames, expected['tokens'], expected['names'])
+            if i != None:
+                found = '(none)'
+                if i < len(tokens):
+                    found = describe(tokens[i], lexerNames)
+                wanted = '(none)'
+                if i < len(expected['tokens']):
+                    wanted = describe(expected['tokens'][i], expected['names'])
+                self.fail('{file}: token {index} is {found}, expected {wanted}'.format(
+                    file=os.path.basename(path), index=i, found=found, wanted=wanted))
+
+            for token, other in zip(tokens, expected['tokens']):
+                if type(token).__name__ == 'list' and type(other).__name__ == 'list':
+                    self.assertEqual(token[2], other[2], '{file}: {token} should be on line {line}'.format(
+                        file=os.path.basename(path), token=describe(token, lexerNames), line=other[2]))
+
+    def test_binary_strings(self):
+        self.assertEqual(lex(u'<?php b\'x\'.B"y".b"$v".b<<<EOT\nEOT;\n'), [
+            ('T_OPEN_TAG', '<?php '),
+            ('T_CONSTANT_ENCAPSED_STRING', "b'x'"),
+            '.',
+            ('T_CONSTANT_ENCAPSED_STRING', 'B"y"'),
+            '.',
+            'b"',
+            ('T_VARIABLE', '$v'),
+            '"',
+            '.',
+            ('T_START_HEREDOC', 'b<<<EOT\n'),
+            ('T_END_HEREDOC', 'EOT'),
+            ';',
+            ('T_WHITESPACE', '\n'),
+        ])
+
+    def test_property_names(self):
+        # Only whitespace keeps the scanner looking for a property name
+        self.assertEqual(lex(u'<?php $x ->  list; $x-> /* c */ if'), [
+            ('T_OPEN_TAG', '<?php '),
+            ('T_VARIABLE', '$x'),
+            ('T_WHITESPACE', ' '),
+            ('T_OBJECT_OPERATOR', '->'),
+            ('T_WHITESPACE', '  '),
+            ('T_STRING', 'list'),
+            ';',
+            ('T_WHITESPACE', ' '),
+            ('T_VARIABLE', '$x'),
+            ('T_OBJECT_OPERATOR', '->'),
+            ('T_WHITESPACE', ' '),
+            ('T_COMMENT', '/* c */'),
+            ('T_WHITESPACE', ' '),
+            ('T_IF', 'if'),
+        ])
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['record']:
+        for path in sys.argv[2:]:
+            shutil.copy(path, FIXTURES)
+        for path in fixture_files():
+            record(path)
+    else:
+        unittest.main()
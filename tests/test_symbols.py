@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+
+'''
+Tests for the class member extraction that builds symbol tables.
+'''
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import magentointel_engine
+
+
+CLASS_SOURCE = u'''<?php
+abstract class Mage_Sales_Model_Order extends Mage_Sales_Model_Abstract
+{
+    const STATE_NEW = 'new', STATE_CLOSED = 'closed';
+    const STATES = array(self::STATE_NEW, FOO, BAR), FLAGS = [BAZ, 2];
+
+    /**
+     * @var Mage_Sales_Model_Order_Item[]
+     */
+    protected $_items = array(1, 2), $_payments, $_eventPrefix = 'sales_order';
+    public static $instances = [];
+
+    abstract protected function _loadItems($orderId, $field = null);
+
+    public function getItems(): Mage_Sales_Model_Resource_Order_Item_Collection
+    {
+        $filter = function ($item) use ($orderId) {
+            return $item->getOrderId() == $orderId;
+        };
+        return array_filter($this->_items, $filter);
+    }
+
+    /**
+     * @return Mage_Sales_Model_Order_Payment
+     */
+    public function getPayment($id)
+    {
+        return array_map(function ($payment, $key) { return $payment; }, $this->_payments);
+    }
+
+    private function getCustomer(): ?\\Mage_Customer_Model_Customer
+    {
+    }
+
+    public static function load($id, array $options = array('a' => 1)) {}
+}
+'''
+
+
+class ExtractSymbolsTest(unittest.TestCase):
+
+    def setUp(self):
+        magentointel_engine.set_environment(magentointel_engine.Environment([], {'tokenizer': 'python'}))
+        self.engine = magentointel_engine.CompletionEngine()
+        self.engine.get_all_token_names()
+        tokens = magentointel_engine.PhpLexer(CLASS_SOURCE).tokenize()
+        self.symbols = self.engine.extract_symbols(tokens)
+
+    def symbol(self, name):
+        self.assertTrue(name in self.symbols, name)
+        return self.symbols[name].pack()
+
+    def test_members(self):
+        self.assertEqual(sorted(self.symbols.keys()), ['$_eventPrefix', '$_items', '$_payments', '$instances',
+            'FLAGS', 'STATES', 'STATE_CLOSED', 'STATE_NEW', '_loadItems', 'getCustomer', 'getItems', 'getPayment',
+            'load'])
+
+    def test_constants(self):
+        for name in ('STATE_NEW', 'STATE_CLOSED', 'STATES', 'FLAGS'):
+            self.assertEqual(self.symbol(name), ['constant', (), '', 'public', True, 'Mage_Sales_Model_Order'])
+
+    def test_properties(self):
+        self.assertEqual(self.symbol('$_items'),
+            ['variable', (), 'Mage_Sales_Model_Order_Item[]', 'protected', False, 'Mage_Sales_Model_Order'])
+        self.assertEqual(self.symbol('$_payments')[3], 'protected')
+        self.assertEqual(self.symbol('$_eventPrefix')[3], 'protected')
+        self.assertEqual(self.symbol('$instances'), ['variable', (), '', 'public', True, 'Mage_Sales_Model_Order'])
+
+    def test_functions(self):
+        self.assertEqual(self.symbol('_loadItems'),
+            ['function', ('$orderId', '$field'), '', 'protected', False, 'Mage_Sales_Model_Order'])
+        self.assertEqual(self.symbol('getItems'), ['function', (), 'Mage_Sales_Model_Resource_Order_Item_Collection',
+            'public', False, 'Mage_Sales_Model_Order'])
+        self.assertEqual(self.symbol('getPayment'), ['function', ('$id',), 'Mage_Sales_Model_Order_Payment', 'public',
+            False, 'Mage_Sales_Model_Order'])
+        self.assertEqual(self.symbol('getCustomer'), ['function', (), 'Mage_Customer_Model_Customer', 'private',
+            False, 'Mage_Sales_Model_Order'])
+        self.assertEqual(self.symbol('load'),
+            ['function', ('$id', '$options'), '', 'public', True, 'Mage_Sales_Model_Order'])
+
+
+if __name__ == '__main__':
+    unittest.main()